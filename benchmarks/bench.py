@@ -0,0 +1,179 @@
+"""Benchmarks for the core inference routines.
+
+Run from the repository root::
+
+    python -m benchmarks.bench --output results.json
+    python -m benchmarks.bench --baseline results.json
+
+Every benchmark reports the best wall time of ``--repeat`` runs; the DP
+caches are dropped before each run so cached tables are never measured.
+Results are written as JSON (``{"meta": ..., "results": {name: seconds}}``).
+With ``--baseline`` the run is compared against an earlier results file and
+the exit status is 1 when any benchmark got slower by more than
+``--tolerance``.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bracket import BracketSimulator
+
+DEFAULT_SIZES = [2 ** k for k in range(1, 13)]
+DEFAULT_CSV_ROWS = [10_000, 100_000, 1_000_000]
+
+
+def random_matrix(n: int, seed: int = 0) -> np.ndarray:
+    """Random matrix with ``m[j, i] == 1 - m[i, j]``; shared with the tests."""
+    rng = np.random.default_rng(seed)
+    upper = np.triu(rng.random((n, n)), 1)
+    matrix = upper + np.tril(1 - upper.T, -1)
+    np.fill_diagonal(matrix, 0.5)
+    return matrix
+
+
+def best_time(func: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_inference(sizes: List[int], repeat: int) -> Dict[str, float]:
+    results = {}
+    for n in sizes:
+        teams = [f"T{i}" for i in range(n)]
+        sim = BracketSimulator(teams, matrix=random_matrix(n))
+        results[f"dp/n={n}"] = best_time(sim._dp, repeat, sim.invalidate)
+        results[f"marginals_dp/n={n}"] = best_time(sim._marginals_dp, repeat, sim.invalidate)
+        results[f"solve/n={n}"] = best_time(sim.solve, repeat, sim.invalidate)
+        struct = sim.most_likely_bracket()[2]
+        results[f"structure_matches/n={n}"] = best_time(
+            lambda: BracketSimulator.structure_matches(struct, teams), repeat
+        )
+    return results
+
+
+def write_csv(path: str, rows: int, seed: int = 0) -> List[str]:
+    """Write ``rows`` probability rows for the smallest field that has them."""
+    n = 2
+    while n * (n - 1) < rows:
+        n *= 2
+    teams = [f"Team{i}" for i in range(n)]
+    a, b = np.nonzero(~np.eye(n, dtype=bool))
+    probs = np.random.default_rng(seed).random(rows)
+    with open(path, "w") as f:
+        f.write("team_a,team_b,prob\n")
+        f.writelines(f"{teams[i]},{teams[j]},{p:.6f}\n" for i, j, p in zip(a[:rows], b[:rows], probs))
+    return teams
+
+
+def bench_csv(row_counts: List[int], repeat: int, workers: Optional[int] = None) -> Dict[str, float]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            path = os.path.join(tmp, f"probs_{rows}.csv")
+            teams = write_csv(path, rows)
+            results[f"load_from_csv/rows={rows}"] = best_time(
+                lambda: BracketSimulator.load_from_csv(teams, path, workers=workers), repeat
+            )
+    return results
+
+
+def bench_gui(sizes: List[int], repeat: int) -> Dict[str, float]:
+    """Time :meth:`main.BracketWidget.set_structure`; empty without PyQt5."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+        from main import BracketWidget
+    except ImportError:
+        return {}
+    app = QApplication.instance() or QApplication([])
+    results = {}
+    for n in sizes:
+        teams = [f"T{i}" for i in range(n)]
+        struct = BracketSimulator(teams, matrix=random_matrix(n)).most_likely_bracket()[2]
+        widget = BracketWidget()
+        results[f"gui_layout/n={n}"] = best_time(lambda: widget.set_structure(teams, struct, {}), repeat)
+    del app
+    return results
+
+
+def run_benchmarks(
+    sizes: List[int] = DEFAULT_SIZES,
+    csv_rows: List[int] = DEFAULT_CSV_ROWS,
+    repeat: int = 3,
+    gui: bool = True,
+    workers: Optional[int] = None,
+) -> Dict[str, float]:
+    results = bench_inference(sizes, repeat)
+    results.update(bench_csv(csv_rows, repeat, workers))
+    if gui:
+        results.update(bench_gui(sizes, repeat))
+    return results
+
+
+def compare(
+    results: Dict[str, float], baseline: Dict[str, float], tolerance: float
+) -> List[Tuple[str, float, float]]:
+    """Return ``(name, baseline, current)`` for benchmarks slower than allowed."""
+    return [
+        (name, baseline[name], seconds)
+        for name, seconds in results.items()
+        if name in baseline and seconds > baseline[name] * (1 + tolerance)
+    ]
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the bracket inference routines.")
+    parser.add_argument("--sizes", type=_int_list, default=DEFAULT_SIZES, help="comma-separated bracket sizes")
+    parser.add_argument("--csv-rows", type=_int_list, default=DEFAULT_CSV_ROWS, help="comma-separated CSV row counts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the best is reported")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for CSV parsing")
+    parser.add_argument("--no-gui", action="store_true", help="skip the GUI layout benchmarks")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.csv_rows, args.repeat, not args.no_gui, args.workers)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    for name, seconds in results.items():
+        print(f"{name:32s} {seconds * 1e3:10.3f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        slower = compare(results, baseline, args.tolerance)
+        for name, before, after in slower:
+            print(f"REGRESSION {name}: {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
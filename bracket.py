@@ -1,39 +1,799 @@
 """Core logic for March Madness bracket simulation and inference.
 
-We treat the tournament as a fixed 64-team single-elimination bracket.  The user
-provides probability estimates for every possible matchup (A beats B), and the
-simulator will compute:
+We treat the tournament as a single-elimination bracket over a power-of-two
+number of slots; byes and play-in games fill the slots of smaller or larger
+fields.  The user provides probability estimates for every possible matchup
+(A beats B), and the simulator will compute:
 
 * the most probable full-bracket resolution (maximum-likelihood bracket)
 * the probability that each team wins the tournament
 * Monte-Carlo simulation of many random brackets using the supplied
   probabilities
 
-The dynamic programming routine in :func:`_dp` builds up maximum-likelihood
-sub-brackets for every team across all subtrees of the bracket.
+The dynamic programming routine in :func:`_dp` keeps, for every team and
+round, the best log-probability of the team winning its sub-bracket and an
+argmax back-pointer to its opponent; brackets are reconstructed from those
+pointers as flat heap-ordered winner arrays.
 """
 from __future__ import annotations
 
-from typing import Dict, List, Tuple, Any
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union, Any
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import contextlib
+import copy
 import csv
+import functools
+import hashlib
+import heapq
+import io
+import json
 import math
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from scoring import game_weights, score_fields
+from topology import BracketTopology
 
 Team = str
 
+# one bracket entry: a team, a bye (``None``) or a play-in game between two
+# teams, see _expand_entries
+Entry = Union[Team, None, Tuple[Team, Team]]
+
 PairwiseProbabilities = Dict[Tuple[Team, Team], float]
 
+# number of brackets sampled per batch by :meth:`BracketSimulator.simulate`;
+# bounds the size of the temporary uniform and probability arrays
+SIMULATION_CHUNK = 1 << 16
+
+# brackets per independently seeded shard in
+# :meth:`BracketSimulator.simulate_counts`; results depend on this value but
+# never on the number of worker processes
+SIMULATION_SHARD = 1 << 20
+
+# approximate size of the blocks :meth:`BracketSimulator.load_from_csv`
+# reads and parses at a time
+CSV_CHUNK_BYTES = 1 << 24
+
+# default memory budget of the per-simulator probability block cache
+BLOCK_CACHE_BYTES = 1 << 28
+
+# brackets scored per shard of optimize_pool_bracket
+POOL_SHARD = 1 << 12
+
+# memory budget for the probability blocks of one scenario_round_probabilities batch
+SCENARIO_CHUNK_BYTES = 1 << 26
+
+
+def _logsumexp(a: np.ndarray, axis: int) -> np.ndarray:
+    """Numerically stable ``log(sum(exp(a)))`` along ``axis``."""
+    peak = a.max(axis=axis, keepdims=True)
+    peak[~np.isfinite(peak)] = 0.0
+    with np.errstate(divide="ignore"):
+        return np.log(np.exp(a - peak).sum(axis=axis)) + np.squeeze(peak, axis=axis)
+
+
+class Profiler:
+    """Timings, counters and memory use recorded while :func:`profiling` is active.
+
+    ``phases`` maps a phase name to ``[calls, seconds]``; nested phases are
+    timed inclusively.  ``counters`` holds event counts such as ``_p`` calls
+    and ``matrix_lookups`` (probabilities gathered from the matrix).  With
+    memory tracing on, ``peak_bytes`` is the :mod:`tracemalloc` peak and
+    ``new_blocks`` the net number of memory blocks allocated and not freed.
+    Work done in pool worker processes is timed as a whole by the caller
+    but not broken down.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.phases: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.peak_bytes = 0
+        self.new_blocks = 0
+
+    def count(self, name: str, k: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + k
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.phases.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+
+    def report(self) -> str:
+        """Format the recorded data as a plain-text table."""
+        lines = ["phase                          calls      total ms"]
+        for name, (calls, seconds) in sorted(self.phases.items(), key=lambda x: -x[1][1]):
+            lines.append(f"{name:28s} {calls:7d} {seconds * 1e3:13.3f}")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:28s} {value:21,d}")
+        if self.trace_memory:
+            lines.append(f"{'peak memory (MiB)':28s} {self.peak_bytes / 2 ** 20:21.1f}")
+            lines.append(f"{'new memory blocks':28s} {self.new_blocks:21,d}")
+        return "\n".join(lines)
+
+
+_PROFILER: Optional[Profiler] = None
+_NO_PHASE = contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def profiling(trace_memory: bool = True):
+    """Record what the simulator spends time and memory on inside the block.
+
+    Yields a :class:`Profiler`; instrumentation costs nothing while no
+    profiler is active.  Memory tracing uses :mod:`tracemalloc`, which
+    slows allocation-heavy code down noticeably, so it can be switched off.
+    """
+    global _PROFILER
+    prof = Profiler(trace_memory)
+    started = trace_memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    if trace_memory:
+        tracemalloc.reset_peak()
+        blocks = len(tracemalloc.take_snapshot().traces)
+    previous, _PROFILER = _PROFILER, prof
+    try:
+        yield prof
+    finally:
+        _PROFILER = previous
+        if trace_memory:
+            prof.peak_bytes = tracemalloc.get_traced_memory()[1]
+            prof.new_blocks = len(tracemalloc.take_snapshot().traces) - blocks
+            if started:
+                tracemalloc.stop()
+
+
+def _phase(name: str):
+    """Time a phase when a profiler is active."""
+    return _PROFILER.phase(name) if _PROFILER is not None else _NO_PHASE
+
+
+def _profiled(name: str) -> Callable[[Callable], Callable]:
+    """Decorator timing every call of a function as phase ``name``."""
+
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _PROFILER is None:
+                return func(*args, **kwargs)
+            with _PROFILER.phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def _count(name: str, k: int = 1) -> None:
+    if _PROFILER is not None:
+        _PROFILER.count(name, k)
+
+
+class CsvChunkStats(NamedTuple):
+    """Per-block report produced while streaming a probability CSV."""
+
+    chunk: int
+    nbytes: int
+    rows: int
+    skipped: int
+    rejected: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+
+def _parse_csv_chunk(
+    lines: List[bytes], index: Dict[Team, int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, CsvChunkStats]:
+    """Parse a block of CSV lines into ``(rows, cols, probs, stats)`` arrays."""
+    start = time.perf_counter()
+    rows: List[int] = []
+    cols: List[int] = []
+    probs: List[float] = []
+    skipped = rejected = 0
+    text = b"".join(lines).decode("utf-8-sig")
+    for row in csv.reader(io.StringIO(text, newline="")):
+        if not row or row[0].startswith("#"):
+            continue
+        if len(row) != 3:
+            rejected += 1
+            continue
+        a, b, p_str = row
+        try:
+            p = float(p_str)
+        except ValueError:
+            rejected += 1
+            continue
+        if not 0.0 <= p <= 1.0:
+            rejected += 1
+            continue
+        i = index.get(a)
+        j = index.get(b)
+        if i is None or j is None:
+            skipped += 1
+            continue
+        rows.append(i)
+        cols.append(j)
+        probs.append(p)
+    stats = CsvChunkStats(
+        chunk=0,
+        nbytes=sum(len(line) for line in lines),
+        rows=len(probs),
+        skipped=skipped,
+        rejected=rejected,
+        seconds=time.perf_counter() - start,
+    )
+    return np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp), np.array(probs), stats
+
+
+def _file_signature(path: str, with_hash: bool = True) -> Dict[str, Any]:
+    """Size, mtime and (optionally) SHA-256 of ``path`` used as a cache key."""
+    st = os.stat(path)
+    sig: Dict[str, Any] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        sig["sha256"] = digest.hexdigest()
+    return sig
+
+
+def _erf(x: np.ndarray) -> np.ndarray:
+    """Vectorized error function (Abramowitz & Stegun 7.1.26, |error| < 1.5e-7)."""
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1.0 - poly * np.exp(-x * x))
+
+
+# link functions mapping a scaled rating difference to a win probability
+LINK_FUNCTIONS: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "logistic": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "normal": lambda x: 0.5 * (1.0 + _erf(x / math.sqrt(2.0))),
+    "elo": lambda x: 1.0 / (1.0 + 10.0 ** (-x)),
+}
+
+# default rating-difference scale per link: points of efficiency margin for
+# "logistic"/"normal" (KenPom-style ratings) and Elo points for "elo"
+DEFAULT_SCALES: Dict[str, float] = {"logistic": 10.0, "normal": 11.0, "elo": 400.0}
+
+Link = Any  # a key of LINK_FUNCTIONS or a callable on scaled differences
+
+
+def rating_probabilities(
+    ratings_a: np.ndarray, ratings_b: np.ndarray, link: Link = "logistic", scale: Optional[float] = None
+) -> np.ndarray:
+    """Probability that teams rated ``ratings_a`` beat teams rated ``ratings_b``.
+
+    ``link`` is one of :data:`LINK_FUNCTIONS` or any vectorized callable
+    applied to ``(ratings_a - ratings_b) / scale``; ``scale`` defaults to
+    :data:`DEFAULT_SCALES` for named links and 1.0 otherwise.
+    """
+    if scale is None:
+        scale = DEFAULT_SCALES.get(link, 1.0) if isinstance(link, str) else 1.0
+    func = LINK_FUNCTIONS[link] if isinstance(link, str) else link
+    return func((np.asarray(ratings_a) - np.asarray(ratings_b)) / scale)
+
+
+class RatingFallback:
+    """Win probabilities from per-team ratings through a link function.
+
+    ``ratings`` are aligned with the bracket's team list and
+    :func:`rating_probabilities` turns rating differences into
+    probabilities.  Instances are called with whole index arrays so missing
+    pairs are filled in one batch.
+    """
+
+    def __init__(self, ratings: Sequence[float], scale: Optional[float] = None, link: Link = "logistic"):
+        self.ratings = np.asarray(ratings, dtype=np.float64)
+        self.scale = scale
+        self.link = link
+
+    def __call__(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return rating_probabilities(self.ratings[rows], self.ratings[cols], self.link, self.scale)
+
+
+class SparseProbabilities:
+    """Pairwise win probabilities stored only for the pairs actually supplied.
+
+    Entries are kept as a sorted array of ``i * n + j`` keys with a parallel
+    array of probabilities, so memory is proportional to the number of
+    pairs given.  Indexing mirrors a dense ``(n, n)`` array:
+    ``store[rows, cols]`` accepts broadcastable integer arrays, resolves
+    them with one vectorized binary search and fills every missing pair with
+    a single call to ``fallback(rows, cols)`` (0.5 when no fallback is set).
+    """
+
+    def __init__(
+        self,
+        n: int,
+        rows: Sequence[int],
+        cols: Sequence[int],
+        probs: Sequence[float],
+        fallback: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None,
+    ):
+        keys = np.asarray(rows, dtype=np.int64) * n + np.asarray(cols, dtype=np.int64)
+        values = np.asarray(probs, dtype=np.float64)
+        # duplicated pairs keep the value supplied last
+        keys, first = np.unique(keys[::-1], return_index=True)
+        self.keys = keys
+        self.values = values[::-1][first]
+        self.shape = (n, n)
+        self.dtype = np.dtype(np.float64)
+        self.fallback = fallback
+
+    @classmethod
+    def from_pairwise(
+        cls,
+        teams: Sequence[Optional[Team]],
+        pairwise: PairwiseProbabilities,
+        fallback: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None,
+    ) -> "SparseProbabilities":
+        """Build a store from a ``{(a, b): p}`` mapping over ``teams``."""
+        index = {t: i for i, t in enumerate(teams)}
+        pairs = [(index[a], index[b], p) for (a, b), p in pairwise.items() if a in index and b in index]
+        rows, cols, probs = zip(*pairs) if pairs else ((), (), ())
+        return cls(len(teams), rows, cols, probs, fallback)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.values.nbytes
+
+    def __getitem__(self, key: Tuple[Any, Any]) -> Any:
+        rows, cols = np.broadcast_arrays(np.asarray(key[0], dtype=np.int64), np.asarray(key[1], dtype=np.int64))
+        flat = rows * self.shape[0] + cols
+        pos = np.minimum(np.searchsorted(self.keys, flat), max(len(self.keys) - 1, 0))
+        if len(self.keys):
+            hit = self.keys[pos] == flat
+            out = np.where(hit, self.values[pos], 0.5)
+        else:
+            hit = np.zeros(flat.shape, dtype=bool)
+            out = np.full(flat.shape, 0.5)
+        if self.fallback is not None and not hit.all():
+            miss = ~hit
+            out[miss] = self.fallback(rows[miss], cols[miss])
+        return float(out) if out.ndim == 0 else out
+
+    def copy(self) -> "SparseProbabilities":
+        """Return an independent store sharing only the fallback."""
+        clone = copy.copy(self)
+        clone.keys = self.keys.copy()
+        clone.values = self.values.copy()
+        return clone
+
+    def set(self, i: int, j: int, p: float) -> None:
+        """Store ``p`` for the pair ``(i, j)``, adding it if it was missing."""
+        key = i * self.shape[0] + j
+        pos = int(np.searchsorted(self.keys, key))
+        if pos < len(self.keys) and self.keys[pos] == key:
+            self.values[pos] = p
+        else:
+            self.keys = np.insert(self.keys, pos, key)
+            self.values = np.insert(self.values, pos, p)
+
+    def to_dense(self) -> np.ndarray:
+        """Materialize the full ``(n, n)`` matrix, fallback values included."""
+        n = self.shape[0]
+        idx = np.arange(n)
+        return self[idx[:, None], idx[None, :]]
+
+
+class BlockCache:
+    """Bounded LRU of per-round probability blocks shared by every DP pass.
+
+    Entries are keyed by the half-width of a round's games (which fixes the
+    slot ranges of all of its games) and stamped with the simulator's matrix
+    version; an entry read back under another version counts as a miss.
+    Least recently used rounds are evicted once the arrays held exceed
+    ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int = BLOCK_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[int, Dict[str, np.ndarray]]]" = OrderedDict()
+
+    def get(self, key: int, version: int) -> Optional[Dict[str, np.ndarray]]:
+        item = self._entries.get(key)
+        if item is None or item[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: int, version: int, arrays: Dict[str, np.ndarray]) -> None:
+        """Insert or replace an entry (also used after adding arrays to one)."""
+        self._drop(key)
+        size = sum(a.nbytes for a in arrays.values())
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (version, arrays)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def restamp(self, old: int, new: int) -> None:
+        """Mark entries valid at version ``old`` as valid at ``new``."""
+        for key, (version, arrays) in self._entries.items():
+            if version == old:
+                self._entries[key] = (new, arrays)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _drop(self, key: int) -> None:
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self.nbytes -= sum(a.nbytes for a in item[1].values())
+
+
+class _PassTables:
+    """Per-round output of one DP pass over the bracket.
+
+    ``values[r]`` holds one entry per team for round ``r + 1`` (win
+    probability, log-probability or best log-score, depending on the pass),
+    ``back[r]`` the argmax opponents for max-product passes,
+    ``stale[r]`` one flag per game of that round that still needs
+    (re)computing and ``log_norm[r]`` the log normalizer applied to each
+    game by locked results (0 for unconstrained games).
+    """
+
+    def __init__(self, n: int, with_back: bool = False):
+        rounds = n.bit_length() - 1
+        self.values = [np.empty(n) for _ in range(rounds)]
+        self.back = [np.empty(n, dtype=np.intp) for _ in range(rounds)] if with_back else []
+        self.stale = [np.ones(n >> (r + 1), dtype=bool) for r in range(rounds)]
+        self.log_norm = [np.zeros(n >> (r + 1)) for r in range(rounds)]
+
+
+def _sum_round(sides: np.ndarray, block: np.ndarray) -> np.ndarray:
+    """One round of the sum-product pass for ``(games, 2, half)`` win probabilities.
+
+    Leading batch axes on ``sides`` and ``block`` (e.g. one per probability
+    scenario) are carried through.
+    """
+    left, right = sides[..., 0, :], sides[..., 1, :]
+    new_left = left * np.matmul(block, right[..., None])[..., 0]
+    new_right = right * np.matmul(left[..., None, :], 1 - block)[..., 0, :]
+    return np.stack([new_left, new_right], axis=-2)
+
+
+def _logsum_round(sides: np.ndarray, log_win: np.ndarray, log_lose: np.ndarray) -> np.ndarray:
+    """:func:`_sum_round` on log-probabilities using log-sum-exp."""
+    left, right = sides[..., 0, :], sides[..., 1, :]
+    new_left = left + _logsumexp(log_win + right[..., None, :], axis=-1)
+    new_right = right + _logsumexp(log_lose + left[..., :, None], axis=-2)
+    return np.stack([new_left, new_right], axis=-2)
+
+
+def _max_round(sides: np.ndarray, log_win: np.ndarray, log_lose: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """One round of the log-space max-product pass.
+
+    Returns the new best scores and, for every team, the position of its
+    argmax opponent within the game (``0 .. 2 * half - 1``).
+    """
+    half = sides.shape[2]
+    joint = sides[:, 0, :, None] + sides[:, 1, None, :]
+    cand_left = joint + log_win
+    cand_right = joint + log_lose
+    opp_left = cand_left.argmax(axis=2)
+    opp_right = cand_right.argmax(axis=1)
+    best = np.stack(
+        [
+            np.take_along_axis(cand_left, opp_left[:, :, None], axis=2)[:, :, 0],
+            np.take_along_axis(cand_right, opp_right[:, None, :], axis=1)[:, 0, :],
+        ],
+        axis=1,
+    )
+    return best, np.stack([opp_left + half, opp_right], axis=1)
+
+
+def _outside_sum_round(sides: np.ndarray, block: np.ndarray, above: np.ndarray) -> np.ndarray:
+    """One round of the top-down pass of :func:`_condition_on_locks`.
+
+    ``sides`` are the bottom-up win probabilities entering the round and
+    ``above[..., g, s, i]`` the (scaled) probability of the locked results
+    after it given that team ``i`` wins game ``g``, zero where a lock rules
+    ``i`` out.  Returns the same quantity for the teams winning the
+    previous round: either the team wins this game too or its opponent
+    does, and both are weighted by their evidence from above.
+    """
+    left, right = sides[..., 0, :], sides[..., 1, :]
+    up_left, up_right = above[..., 0, :], above[..., 1, :]
+    new_left = (
+        up_left * np.matmul(block, right[..., None])[..., 0]
+        + np.matmul(1 - block, (right * up_right)[..., None])[..., 0]
+    )
+    new_right = (
+        up_right * np.matmul(left[..., None, :], 1 - block)[..., 0, :]
+        + np.matmul((left * up_left)[..., None, :], block)[..., 0, :]
+    )
+    return np.stack([new_left, new_right], axis=-2)
+
+
+def _outside_logsum_round(
+    sides: np.ndarray, log_win: np.ndarray, log_lose: np.ndarray, above: np.ndarray
+) -> np.ndarray:
+    """:func:`_outside_sum_round` on log-probabilities using log-sum-exp."""
+    left, right = sides[..., 0, :], sides[..., 1, :]
+    up_left, up_right = above[..., 0, :], above[..., 1, :]
+    new_left = np.logaddexp(
+        up_left + _logsumexp(log_win + right[..., None, :], axis=-1),
+        _logsumexp(log_lose + (right + up_right)[..., None, :], axis=-1),
+    )
+    new_right = np.logaddexp(
+        up_right + _logsumexp(log_lose + left[..., :, None], axis=-2),
+        _logsumexp(log_win + (left + up_left)[..., :, None], axis=-2),
+    )
+    return np.stack([new_left, new_right], axis=-2)
+
+
+def _condition_on_locks(
+    values: np.ndarray,
+    forced: List[Dict[int, int]],
+    block_of: Callable[[int], Any],
+    log_space: bool,
+) -> np.ndarray:
+    """Condition bottom-up round probabilities on the locks of later rounds.
+
+    ``values`` is a ``(..., n, rounds)`` table from the marginal pass, which
+    already accounts for every lock in or below each game.  A lock further
+    up (e.g. "T0 won the round-2 game") also tells us who T0 beat in round
+    1, so earlier columns are reweighted top-down by the probability of the
+    later evidence given each team's win (the outside pass of the
+    inside-outside algorithm) and renormalized per game.  ``block_of(r)``
+    returns round ``r``'s probability block, or ``(log_win, log_lose)``
+    with ``log_space``.  Rounds from the last locked one up are returned
+    unchanged.
+    """
+    n, rounds = values.shape[-2:]
+    lead = values.shape[:-2]
+    locked = [r for r in range(rounds) if forced[r]]
+    if not locked or locked[-1] == 0:
+        return values
+    out = values.copy()
+    above = np.zeros(lead + (n,)) if log_space else np.ones(lead + (n,))
+    for r in range(locked[-1], 0, -1):
+        half = 1 << r
+        allowed = np.ones(n, dtype=bool)
+        for g, w in forced[r].items():
+            allowed[g * 2 * half : (g + 1) * 2 * half] = False
+            allowed[w] = True
+        sides = values[..., r - 1].reshape(lead + (-1, 2, half))
+        if log_space:
+            up = np.where(allowed, above, -np.inf).reshape(sides.shape)
+            above = _outside_logsum_round(sides, *block_of(r), up).reshape(lead + (-1, half))
+            peak = above.max(axis=-1, keepdims=True)
+            above = above - np.where(np.isfinite(peak), peak, 0.0)
+            joint = values[..., r - 1].reshape(above.shape) + above
+            joint = joint - _logsumexp(joint, axis=-1)[..., None]
+        else:
+            up = np.where(allowed, above, 0.0).reshape(sides.shape)
+            above = _outside_sum_round(sides, block_of(r), up).reshape(lead + (-1, half))
+            # rescale per game so long chains of locks cannot underflow
+            peak = above.max(axis=-1, keepdims=True)
+            above = above / np.where(peak > 0, peak, 1.0)
+            joint = values[..., r - 1].reshape(above.shape) * above
+            total = joint.sum(axis=-1, keepdims=True)
+            joint = joint / np.where(total > 0, total, 1.0)
+        above = above.reshape(lead + (n,))
+        out[..., r - 1] = joint.reshape(lead + (n,))
+    return out
+
+
+def _apply_byes(probs: np.ndarray, rows: np.ndarray, cols: np.ndarray, is_bye: np.ndarray) -> np.ndarray:
+    """Decide the games involving a bye among probabilities gathered at ``(rows, cols)``.
+
+    Every team beats a bye.  A game between two byes has no real result:
+    the lower slot advances with probability 1, so it neither splits a
+    bracket's probability nor doubles it into indistinguishable brackets,
+    and it then loses its next game against a team.  ``probs`` may carry
+    leading axes (e.g. scenarios) in front of the shape of ``rows``.
+    """
+    bye_row, bye_col = is_bye[rows], is_bye[cols]
+    decided = ~bye_row | (bye_col & (rows < cols))
+    return np.where(bye_row | bye_col, decided, probs)
+
+
+def _draw(rng: np.random.Generator, weights: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+    """Draw an index along the last axis of ``weights`` for every entry of ``shape``.
+
+    ``weights`` need not be normalized and broadcasts against ``shape``;
+    entries with weight zero are never drawn.
+    """
+    cumulative = np.cumsum(weights, axis=-1)
+    u = rng.random(shape) * cumulative[..., -1]
+    return np.minimum((cumulative <= u[..., None]).sum(axis=-1), weights.shape[-1] - 1)
+
+
+def _play_in_rounds(entries: Sequence[Entry]) -> int:
+    """Number of extra rounds ``entries`` add in front of the real first round."""
+    return int(any(isinstance(e, tuple) for e in entries))
+
+
+def _expand_entries(entries: Sequence[Entry]) -> List[Optional[Team]]:
+    """Lay out a list of bracket entries as one team per slot.
+
+    Entries are team names, ``None`` for a bye or a ``(team_a, team_b)``
+    tuple for a play-in game whose winner takes the entry's place.  With any
+    play-ins the bracket gets an extra first round: each play-in fills two
+    slots and every other entry is paired with a bye.  The result lists a
+    team or ``None`` for every slot; expanding it again returns it
+    unchanged.
+    """
+    slots = list(entries)
+    if any(isinstance(e, tuple) for e in slots):
+        expanded: List[Optional[Team]] = []
+        for e in slots:
+            if isinstance(e, tuple):
+                if len(e) != 2 or None in e:
+                    raise ValueError(f"A play-in game needs exactly two teams, got {e!r}")
+                expanded.extend(e)
+            else:
+                expanded.extend([e, None])
+        slots = expanded
+    n = len(slots)
+    if n < 2 or (n & (n - 1)) != 0:
+        raise ValueError("Number of teams must be a power of two and at least 2")
+    if all(t is None for t in slots):
+        raise ValueError("A bracket needs at least one team")
+    return slots
+
+
+def read_teams(path: str) -> List[Entry]:
+    """Read bracket entries from a teams file, one entry per line.
+
+    A line holds a team name, ``BYE`` for a bye or ``A/B`` for a play-in
+    game between ``A`` and ``B``; blank lines and lines starting with ``#``
+    are ignored.  The result is an entry list as accepted by
+    :class:`BracketSimulator` and its loaders.
+    """
+    entries: List[Entry] = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.upper() == "BYE":
+                entries.append(None)
+            elif "/" in line:
+                entries.append(tuple(part.strip() for part in line.split("/")))
+            else:
+                entries.append(line)
+    return entries
+
+
+class BracketSolution(NamedTuple):
+    """Everything :meth:`BracketSimulator.solve` computes in one traversal."""
+
+    champion: Team
+    probability: float
+    winners: np.ndarray
+    marginals: Dict[Team, float]
+    rounds: np.ndarray
+
+
+class PoolResult(NamedTuple):
+    """Outcome of :meth:`BracketSimulator.optimize_pool_bracket`."""
+
+    winners: np.ndarray
+    win_probability: float
+    candidates: np.ndarray
+    win_probabilities: np.ndarray
+
 
 class BracketSimulator:
-    def __init__(self, teams: List[Team], pairwise: PairwiseProbabilities):
-        # support any single-elimination bracket size that is a power of two
+    def __init__(
+        self,
+        teams: Sequence[Entry],
+        pairwise: Optional[PairwiseProbabilities] = None,
+        matrix: Optional[np.ndarray] = None,
+        play_in_rounds: Optional[int] = None,
+    ):
+        # support any single-elimination bracket size that is a power of two;
+        # byes and play-ins are laid out as extra slots, see _expand_entries
+        if play_in_rounds is None:
+            play_in_rounds = _play_in_rounds(teams)
+        # rounds in front of the real first round (the play-in round); public
+        # round numbers and scoring weights refer to the real rounds
+        self.play_in_rounds = play_in_rounds
+        if any(t is None or isinstance(t, tuple) for t in teams):
+            teams = _expand_entries(teams)
         n = len(teams)
         if n < 2 or (n & (n - 1)) != 0:
             raise ValueError("Number of teams must be a power of two and at least 2")
         self.teams = teams
+        # games, rounds and slot ranges shared with every bracket of this size
+        self.topology = BracketTopology.of(n)
+        # ``pairwise`` is only an input format; every inference routine reads
+        # from the dense ``matrix`` where ``matrix[i, j]`` is the probability
+        # that ``teams[i]`` beats ``teams[j]``.
         self.pairwise = pairwise
+        self.index: Dict[Team, int] = {t: i for i, t in enumerate(teams) if t is not None}
+        # a matrix passed in belongs to the caller and is copied before the
+        # first write, see set_probability
+        self._owns_matrix = matrix is None
+        if matrix is None:
+            matrix = self._build_matrix(self.index, pairwise or {}, n)
+        else:
+            # float64 arrays (including read-only ``numpy.memmap`` views of a
+            # binary cache) and sparse stores are used as-is, without copying
+            if not (isinstance(matrix, (np.ndarray, SparseProbabilities)) and matrix.dtype == np.float64):
+                matrix = np.asarray(matrix, dtype=np.float64)
+            if matrix.shape != (n, n):
+                raise ValueError(f"Probability matrix must have shape ({n}, {n})")
+        # slots holding a bye (``None``); games against byes are decided when
+        # probabilities are gathered, see _apply_byes, so the matrix (which
+        # may be the caller's, a memmap or a sparse store) is left alone
+        is_bye = np.array([t is None for t in teams])
+        self._is_bye: Optional[np.ndarray] = is_bye if is_bye.any() else None
+        self.matrix = matrix
+        # cached per-round DP tables, see _solve_pass
+        self._tables: Dict[str, _PassTables] = {}
+        # probability blocks shared by all passes, stamped with the version
+        # of the matrix they were read from
+        self._version = 0
+        self.block_cache = BlockCache()
+        # actual results, {(round, game): winner index}, see lock_result
+        self._locks: Dict[Tuple[int, int], int] = {}
+
+    @staticmethod
+    def _build_matrix(
+        index: Dict[Team, int], pairwise: PairwiseProbabilities, n: Optional[int] = None
+    ) -> np.ndarray:
+        """Convert a ``{(a, b): p}`` mapping into a dense win-probability matrix.
+
+        Pairs that are not listed default to 0.5; pairs involving teams that
+        are not part of the bracket are ignored.  ``n`` is the number of
+        slots when it differs from the number of teams (byes).
+        """
+        n = len(index) if n is None else n
+        matrix = np.full((n, n), 0.5)
+        for (a, b), p in pairwise.items():
+            i = index.get(a)
+            j = index.get(b)
+            if i is not None and j is not None:
+                matrix[i, j] = p
+        return matrix
+
+    @classmethod
+    def _from_own_matrix(cls, teams: List[Optional[Team]], matrix: Any, play_in_rounds: int = 0) -> "BracketSimulator":
+        """Wrap a matrix the loader built itself, so updates need no copy."""
+        sim = cls(teams, matrix=matrix, play_in_rounds=play_in_rounds)
+        sim._owns_matrix = True
+        return sim
 
     @classmethod
-    def load_from_csv(cls, teams: List[Team], csv_path: str) -> "BracketSimulator":
+    @_profiled("csv.load")
+    def load_from_csv(
+        cls,
+        teams: Sequence[Entry],
+        csv_path: str,
+        workers: Optional[int] = None,
+        chunk_bytes: int = CSV_CHUNK_BYTES,
+        on_chunk: Optional[Callable[[CsvChunkStats], None]] = None,
+        sparse: bool = False,
+        fallback: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None,
+    ) -> "BracketSimulator":
         """Create a simulator by reading pairwise probabilities from a CSV file.
 
         The CSV is expected to have three columns::
@@ -43,141 +803,1264 @@ class BracketSimulator:
         Each row must appear only once; the lookup is symmetric (i.e. you only
         need to specify one of (A,B) or (B,A)).  Missing entries default to
         0.5.
+
+        The file is streamed in blocks of about ``chunk_bytes`` whole lines.
+        Each block is parsed into index and probability arrays, which are
+        written into the pre-allocated matrix in file order.  With
+        ``workers`` greater than one the blocks are parsed on a process pool.
+        Rows naming teams outside the bracket are skipped.  Malformed rows
+        (wrong column count, unparsable or out-of-range probability) are
+        rejected and counted instead of aborting the load.  ``on_chunk``
+        receives a :class:`CsvChunkStats` for every block.
+
+        With ``sparse=True`` the pairs are kept in a
+        :class:`SparseProbabilities` store instead of a dense matrix and
+        missing pairs are answered by ``fallback`` (0.5 when omitted).
         """
-        pairwise: PairwiseProbabilities = {}
+        play_in_rounds = _play_in_rounds(teams)
+        teams = _expand_entries(teams)
+        index = {t: i for i, t in enumerate(teams) if t is not None}
+        matrix = None if sparse else np.full((len(teams), len(teams)), 0.5)
+        collected: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+        def apply(chunk: int, parsed: Tuple[np.ndarray, np.ndarray, np.ndarray, CsvChunkStats]) -> None:
+            rows, cols, probs, stats = parsed
+            _count("csv.rows", stats.rows)
+            _count("csv.rejected", stats.rejected)
+            # interleave (a, b) and (b, a) writes so later rows win, as if
+            # the file had been applied row by row
+            both_rows = np.stack([rows, cols], axis=1).ravel()
+            both_cols = np.stack([cols, rows], axis=1).ravel()
+            both_probs = np.stack([probs, 1 - probs], axis=1).ravel()
+            if matrix is None:
+                collected.append((both_rows, both_cols, both_probs))
+            else:
+                matrix[both_rows, both_cols] = both_probs
+            if on_chunk is not None:
+                on_chunk(stats._replace(chunk=chunk))
+
+        with open(csv_path, "rb") as f:
+            blocks = iter(lambda: f.readlines(chunk_bytes), [])
+            if workers is None or workers <= 1:
+                for chunk, lines in enumerate(blocks):
+                    with _phase("csv.parse"):
+                        parsed = _parse_csv_chunk(lines, index)
+                    apply(chunk, parsed)
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_csv_worker, initargs=(index,)
+                ) as pool:
+                    # keep a bounded number of blocks in flight so huge files
+                    # are never held in memory at once
+                    pending: Deque[Future] = deque()
+                    chunk = 0
+                    for lines in blocks:
+                        pending.append(pool.submit(_parse_csv_worker_chunk, lines))
+                        if len(pending) >= 2 * workers:
+                            apply(chunk, pending.popleft().result())
+                            chunk += 1
+                    while pending:
+                        apply(chunk, pending.popleft().result())
+                        chunk += 1
+        if matrix is None:
+            rows, cols, probs = (np.concatenate(parts) for parts in zip(*collected)) if collected else ((), (), ())
+            store = SparseProbabilities(len(teams), rows, cols, probs, fallback)
+            return cls._from_own_matrix(teams, store, play_in_rounds)
+        return cls._from_own_matrix(teams, matrix, play_in_rounds)
+
+    @classmethod
+    @_profiled("from_ratings")
+    def from_ratings(
+        cls,
+        teams: Sequence[Entry],
+        ratings: Any,
+        link: Link = "logistic",
+        scale: Optional[float] = None,
+    ) -> "BracketSimulator":
+        """Create a simulator from one rating per team instead of every pair.
+
+        ``ratings`` is either a ``{team: rating}`` mapping or a sequence
+        aligned with the expanded slot list (:attr:`teams` of the result, see
+        :func:`_expand_entries`), with any placeholder value for byes; with
+        byes or play-ins a mapping is simpler.  The full matrix is built in one vectorized
+        step with :func:`rating_probabilities`, e.g. ``link="elo"`` for Elo
+        ratings or ``link="normal"`` for efficiency margins.
+        """
+        play_in_rounds = _play_in_rounds(teams)
+        teams = _expand_entries(teams)
+        if isinstance(ratings, dict):
+            missing = [t for t in teams if t is not None and t not in ratings]
+            if missing:
+                raise ValueError(f"No rating for teams: {', '.join(missing)}")
+            # byes get a placeholder; their games are decided on lookup
+            ratings = [0.0 if t is None else ratings[t] for t in teams]
+        r = np.asarray(ratings, dtype=np.float64)
+        if r.shape != (len(teams),):
+            raise ValueError("Expected exactly one rating per team")
+        probs = rating_probabilities(r[:, None], r[None, :], link, scale)
+        return cls._from_own_matrix(teams, probs, play_in_rounds)
+
+    @classmethod
+    def load_from_ratings_csv(
+        cls,
+        teams: Sequence[Entry],
+        csv_path: str,
+        link: Link = "logistic",
+        scale: Optional[float] = None,
+        on_chunk: Optional[Callable[[CsvChunkStats], None]] = None,
+    ) -> "BracketSimulator":
+        """Like :meth:`from_ratings` with ratings read from a ``team,rating`` CSV.
+
+        As in :meth:`load_from_csv`, malformed rows (a header, the wrong
+        column count, an unparsable or non-finite rating) are rejected and
+        counted rather than aborting the load; ``on_chunk`` receives the
+        single :class:`CsvChunkStats` for the file.
+        """
+        start = time.perf_counter()
+        ratings: Dict[Team, float] = {}
+        rejected = 0
         with open(csv_path, newline="") as f:
-            reader = csv.reader(f)
-            for row in reader:
+            for row in csv.reader(f):
                 if not row or row[0].startswith("#"):
                     continue
-                a, b, p_str = row
-                p = float(p_str)
-                pairwise[(a, b)] = p
-                pairwise[(b, a)] = 1 - p
-        return cls(teams, pairwise)
+                if len(row) != 2:
+                    rejected += 1
+                    continue
+                team, rating_str = row
+                try:
+                    rating = float(rating_str)
+                except ValueError:
+                    rejected += 1
+                    continue
+                if not math.isfinite(rating):
+                    rejected += 1
+                    continue
+                ratings[team] = rating
+        if on_chunk is not None:
+            on_chunk(
+                CsvChunkStats(
+                    chunk=0,
+                    nbytes=os.path.getsize(csv_path),
+                    rows=len(ratings),
+                    skipped=0,
+                    rejected=rejected,
+                    seconds=time.perf_counter() - start,
+                )
+            )
+        return cls.from_ratings(teams, ratings, link, scale)
+
+    def save_binary(self, path: str, source: Optional[str] = None) -> None:
+        """Write the team list and probability matrix in a fast binary format.
+
+        The matrix is stored as a raw ``.npy`` file at ``path`` and the team
+        list in a JSON sidecar at ``path + ".json"``.  When ``source`` names
+        the CSV the matrix came from, its size, mtime and SHA-256 are recorded
+        so :meth:`load_cached` can tell when the cache is stale.
+        """
+        meta: Dict[str, Any] = {"teams": list(self.teams), "play_in_rounds": self.play_in_rounds}
+        if source is not None:
+            meta["source"] = _file_signature(source)
+        with open(path, "wb") as f:
+            np.save(f, self.dense_matrix())
+        with open(path + ".json", "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    @_profiled("load_binary")
+    def load_binary(cls, path: str, mmap: bool = False) -> "BracketSimulator":
+        """Create a simulator from a file written by :meth:`save_binary`.
+
+        With ``mmap=True`` the matrix is opened read-only as a
+        :class:`numpy.memmap` instead of being read into memory, so every
+        process that loads the same file shares one page-cache copy.
+        """
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        matrix = np.load(path, mmap_mode="r" if mmap else None)
+        return cls._from_own_matrix(meta["teams"], matrix, meta.get("play_in_rounds", 0))
+
+    def dense_matrix(self) -> np.ndarray:
+        """Return the probabilities as a dense ``(n, n)`` float64 array."""
+        if isinstance(self.matrix, SparseProbabilities):
+            return self.matrix.to_dense()
+        return np.asarray(self.matrix, dtype=np.float64)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # workers rebuild whatever DP tables and blocks they need
+        state["_tables"] = {}
+        state["block_cache"] = BlockCache(self.block_cache.max_bytes)
+        matrix = self.matrix
+        if isinstance(matrix, np.memmap) and matrix.filename and matrix.flags.c_contiguous:
+            # re-open the file on unpickling (e.g. in pool workers) instead of
+            # shipping a private copy of the matrix
+            state["matrix"] = (matrix.filename, matrix.offset, matrix.shape)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        if isinstance(state["matrix"], tuple):
+            filename, offset, shape = state["matrix"]
+            state["matrix"] = np.memmap(filename, dtype=np.float64, mode="r", offset=offset, shape=shape)
+        self.__dict__.update(state)
+
+    @classmethod
+    def load_cached(
+        cls,
+        teams: Sequence[Entry],
+        csv_path: str,
+        cache_path: Optional[str] = None,
+        mmap: bool = False,
+    ) -> "BracketSimulator":
+        """Like :meth:`load_from_csv` but reuse a binary cache when it is fresh.
+
+        The cache (``csv_path + ".cache.npy"`` unless ``cache_path`` is given)
+        is used when it was built for the same team list from a CSV with the
+        same size and mtime.  If only the mtime changed the CSV is hashed and
+        the cache is still used when the contents are identical.  Otherwise
+        the CSV is parsed and the cache rewritten, as it is when the cached
+        matrix is missing or unreadable; failing to write the cache is not an
+        error.  ``mmap`` is passed on to :meth:`load_binary` when
+        the cache is used.
+        """
+        entries = teams
+        play_in_rounds = _play_in_rounds(entries)
+        teams = _expand_entries(entries)
+        if cache_path is None:
+            cache_path = csv_path + ".cache.npy"
+        try:
+            with open(cache_path + ".json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        fresh = False
+        if (
+            meta is not None
+            and meta.get("teams") == list(teams)
+            and meta.get("play_in_rounds", 0) == play_in_rounds
+            and "source" in meta
+        ):
+            stored = meta["source"]
+            current = _file_signature(csv_path, with_hash=False)
+            if (stored["size"], stored["mtime_ns"]) == (current["size"], current["mtime_ns"]):
+                fresh = True
+            elif stored["size"] == current["size"]:
+                current = _file_signature(csv_path)
+                if stored["sha256"] == current["sha256"]:
+                    # contents unchanged (e.g. the file was touched); refresh the key
+                    meta["source"] = current
+                    try:
+                        with open(cache_path + ".json", "w") as f:
+                            json.dump(meta, f)
+                    except OSError:
+                        pass
+                    fresh = True
+        if fresh:
+            try:
+                return cls.load_binary(cache_path, mmap=mmap)
+            except (OSError, ValueError):
+                # a missing or truncated matrix is rebuilt like a stale one
+                pass
+        sim = cls.load_from_csv(entries, csv_path)
+        try:
+            sim.save_binary(cache_path, source=csv_path)
+        except OSError:
+            pass
+        return sim
 
     def _p(self, a: Team, b: Team) -> float:
         """Return probability that team a beats team b."""
-        return self.pairwise.get((a, b), 0.5)
+        _count("_p")
+        i = self.index.get(a)
+        j = self.index.get(b)
+        if i is None or j is None:
+            return 0.5
+        return float(self.matrix[i, j])
 
-    def _dp(self, teams: List[Team]) -> Dict[Team, Tuple[float, Any]]:
+    def _dp(self) -> Tuple[np.ndarray, List[np.ndarray]]:
         """Dynamic-program algorithm building best-subtrees.
 
-        Returns a mapping from each team in ``teams`` to a tuple ``(prob,
-        structure)`` where ``prob`` is the probability of the most-likely set of
-        game outcomes in this subtree that leads to that team winning the subtree.
-        ``structure`` is a nested dictionary describing the winners of every
-        match within the subtree and can be flattened for output.
-        """
-        if len(teams) == 1:
-            # leaf node stores its own winner
-            return {teams[0]: (1.0, {"winner": teams[0], "left": None, "right": None})}
-
-        half = len(teams) // 2
-        left = self._dp(teams[:half])
-        right = self._dp(teams[half:])
-
-        result: Dict[Team, Tuple[float, Any]] = {}
-        for a, (pa, struct_a) in left.items():
-            for b, (pb, struct_b) in right.items():
-                # probability of each advancing and winning the final
-                p_a_wins = self._p(a, b)
-                prob_a = pa * pb * p_a_wins
-                prob_b = pa * pb * (1 - p_a_wins)
-
-                # if this matchup produces a better best-bracket for 'a',
-                # record it
-                if prob_a > result.get(a, (0.0, None))[0]:
-                    result[a] = (
-                        prob_a,
-                        {"winner": a, "left": struct_a, "right": struct_b},
-                    )
-                if prob_b > result.get(b, (0.0, None))[0]:
-                    result[b] = (
-                        prob_b,
-                        {"winner": b, "left": struct_a, "right": struct_b},
-                    )
-        return result
+        Works bottom-up one round at a time like :meth:`_marginals_dp` but
+        takes the maximum instead of the sum over opponents.  Returns
+        ``(best, back)`` where ``best[i]`` is the log-probability of the
+        most-likely set of game outcomes that leads to team ``i`` winning the
+        whole bracket, and ``back[r][i]`` is the opponent team ``i`` beats in
+        round ``r + 1`` of its own best sub-bracket.  Only these argmax
+        back-pointers are kept; :meth:`_reconstruct` turns them into a
+        winners array.
 
-    def most_likely_bracket(self) -> Tuple[Team, float, Any]:
+        Working with sums of logs keeps the comparisons meaningful on large
+        fields, where the raw product underflows to 0.0 long before the
+        final.
+        """
+        tables = self._solve_pass("max")
+        return tables.values[-1], tables.back
+
+    def _reconstruct(self, champion: int, back: List[np.ndarray]) -> np.ndarray:
+        """Follow back-pointers from ``champion`` into a heap-ordered winners array.
+
+        Winners of one round are expanded to the next round down at once:
+        the winner of a game and the opponent it beat are the winners of the
+        two games feeding it, the one with the lower slot on the left.
+        """
+        winners = np.empty(len(self.teams) - 1, dtype=self._index_dtype())
+        current = np.array([champion])
+        for r in range(len(back) - 1, -1, -1):
+            start, stop = self.topology.round_columns(r)
+            winners[start:stop] = current
+            opponents = back[r][current]
+            current = np.stack([np.minimum(current, opponents), np.maximum(current, opponents)], axis=1).ravel()
+        return winners
+
+    def most_likely_bracket(self, log_space: bool = False) -> Tuple[Team, float, np.ndarray]:
         """Return the champion, its probability, and the full bracket structure.
 
-        ``bracket`` is a nested dictionary; use :func:`flatten_structure` to
-        convert it to a list of match results.
+        The bracket is a heap-ordered array of winner indices in the same
+        layout as the rows returned by :meth:`simulate`; use
+        :func:`structure_matches` to convert it to a list of match results.
+        With ``log_space=True`` the natural log of the probability is returned
+        instead, which stays finite for fields where the probability itself
+        underflows to 0.0.
         """
-        dp_result = self._dp(self.teams)
-        champ, (prob, structure) = max(dp_result.items(), key=lambda kv: kv[1][0])
-        return champ, prob, structure
+        best, back = self._dp()
+        champ = int(best.argmax())
+        prob = float(best[champ]) if log_space else math.exp(best[champ])
+        return self.teams[champ], prob, self._reconstruct(champ, back)
+
+    def solve(self, log_space: bool = False) -> BracketSolution:
+        """Compute the most likely bracket and all marginals together.
+
+        Equivalent to calling :meth:`most_likely_bracket`,
+        :meth:`probability_of_each_team` and :meth:`round_probabilities`,
+        but the max-product and sum-product passes advance side by side in
+        a single walk over the rounds, sharing every probability block.
+        ``log_space`` applies to the probability and to the marginals.
+        """
+        marg, best = self._solve_passes(("logsum" if log_space else "sum", "max"))
+        rounds = self._conditioned(np.stack(marg.values, axis=1), log_space)
+        champ = int(best.values[-1].argmax())
+        score = float(best.values[-1][champ])
+        return BracketSolution(
+            champion=self.teams[champ],
+            probability=score if log_space else math.exp(score),
+            winners=self._reconstruct(champ, best.back),
+            marginals={t: float(p) for t, p in zip(self.teams, rounds[:, -1]) if t is not None},
+            rounds=rounds,
+        )
+
+    @_profiled("top_k_brackets")
+    def top_k_brackets(self, k: int, log_space: bool = False) -> List[Tuple[float, np.ndarray]]:
+        """Return the ``k`` most probable complete brackets, best first.
+
+        Each entry is ``(probability, winners)`` with ``winners`` in the same
+        heap layout as :meth:`most_likely_bracket` (``log_space=True`` returns
+        log-probabilities).  Brackets with probability zero are never
+        returned, so fewer than ``k`` entries come back for degenerate
+        inputs.
+
+        This is the k-best extension of :meth:`_dp`: for every team and round
+        only the ``k`` best sub-brackets in which it wins are kept, so time
+        and memory grow with ``k`` rather than with the number of brackets.
+        """
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        n = len(self.teams)
+        scores = np.zeros((n, 1))
+        backs: List[np.ndarray] = []
+        forced = self._forced_winners()
+        log_norm = self._solve_pass("logsum").log_norm if self._locks else None
+        half = 1
+        r = 0
+        while half < n:
+            log_win, log_lose = self._log_round_block(half)
+            new_scores = np.full((n, k), -np.inf)
+            back = np.zeros((n, k, 3), dtype=np.int64)
+            start, stop = self.topology.round_columns(r)
+            for g, (lo, mid) in enumerate(zip(self.topology.lo[start:stop], self.topology.mid[start:stop])):
+                _k_best_side(scores, lo, mid, log_win[g], k, new_scores, back)
+                _k_best_side(scores, mid, lo, log_lose[g].T, k, new_scores, back)
+            for g, w in forced[r].items():
+                # condition on the locked result, as in _solve_pass
+                kept = new_scores[w] - log_norm[r][g]
+                new_scores[2 * g * half : 2 * (g + 1) * half] = -np.inf
+                new_scores[w] = kept
+            scores = new_scores
+            backs.append(back)
+            half *= 2
+            r += 1
+
+        results: List[Tuple[float, np.ndarray]] = []
+        for pos in np.argsort(-scores.ravel(), kind="stable")[:k]:
+            team, rank = divmod(int(pos), scores.shape[1])
+            score = scores[team, rank]
+            if score == -np.inf:
+                break
+            winners = self._reconstruct_ranked(team, rank, backs)
+            results.append((float(score) if log_space else math.exp(score), winners))
+        return results
+
+    def _reconstruct_ranked(self, champion: int, rank: int, backs: List[np.ndarray]) -> np.ndarray:
+        """Winners array for the ``rank``-th best bracket won by ``champion``.
+
+        ``backs[r][team, rank]`` holds ``(opponent, own_rank, opponent_rank)``:
+        which sub-bracket of each side was combined in round ``r + 1``.
+        """
+        winners = np.empty(len(self.teams) - 1, dtype=self._index_dtype())
+        current = [(champion, rank)]
+        for r in range(len(backs) - 1, -1, -1):
+            start, stop = self.topology.round_columns(r)
+            winners[start:stop] = [team for team, _ in current]
+            below = []
+            for team, team_rank in current:
+                opp, own_rank, opp_rank = backs[r][team, team_rank]
+                pair = [(team, int(own_rank)), (int(opp), int(opp_rank))]
+                below.extend(sorted(pair))
+            current = below
+        return winners
+
+    @_profiled("best_expected_score_bracket")
+    def best_expected_score_bracket(self, scoring: Optional[Any] = None) -> Tuple[Team, float, np.ndarray]:
+        """Return the bracket with the highest expected pool score.
+
+        ``scoring`` gives the points for a correct pick in each round, either
+        one weight per round (default ``1, 2, 4, ...``, i.e. 1-2-4-8-16-32
+        for 64 teams) or an ``(n, rounds)`` array of points per slot and
+        round, e.g. for seed-based upset bonuses.  Rounds are the real rounds
+        after any play-ins (:attr:`play_in_rounds`), so a 68-team field with
+        a First Four takes the usual six weights; play-in games and games
+        against byes score nothing.  The expected score of a
+        bracket is the sum over its picks of points times the probability
+        from :meth:`round_probabilities` that the pick wins that game, so
+        locked results are taken into account.
+
+        ``V[r][i]``, the best expected score of team ``i``'s round ``r``
+        sub-bracket when ``i`` is picked to win it, is
+        ``points[i, r] * q[i, r] + V[r-1][i] + max(V[r-1][opposite half])``.
+        The maximum does not depend on ``i``, so each round costs O(n)
+        after the marginals.  Returns ``(champion, expected score, winners)``
+        in the same form as :meth:`most_likely_bracket`.
+        """
+        n = len(self.teams)
+        rounds = n.bit_length() - 1
+        real = rounds - self.play_in_rounds
+        if scoring is None:
+            scoring = 2.0 ** np.arange(real)
+        points = np.asarray(scoring, dtype=np.float64)
+        if points.shape not in ((real,), (n, real)):
+            raise ValueError(f"Expected {real} round weights or an ({n}, {real}) array of points")
+        points = np.concatenate([np.zeros((n, self.play_in_rounds)), np.broadcast_to(points, (n, real))], axis=1)
+        if self._is_bye is not None:
+            # a win over a side made up only of byes is no pick and earns nothing
+            for r in range(rounds):
+                empty = self._is_bye.reshape(-1, 2, 1 << r).all(axis=2)
+                points[np.repeat(empty[:, ::-1], 1 << r, axis=1).reshape(n), r] = 0.0
+        gain = points * self._marginals_dp()
+        value = np.zeros(n)
+        back: List[np.ndarray] = []
+        half = 1
+        for r in range(rounds):
+            sides = value.reshape(-1, 2, half)
+            # the best sub-bracket on each side and the team it is picked for
+            best = sides.max(axis=2)
+            arg = sides.argmax(axis=2) + np.arange(0, n, 2 * half).reshape(-1, 1) + np.array([0, half])
+            value = (sides + best[:, ::-1, None]).reshape(n) + gain[:, r]
+            back.append(np.repeat(arg[:, ::-1], half, axis=1).reshape(n))
+            half *= 2
+        champ = int(value.argmax())
+        return self.teams[champ], float(value[champ]), self._reconstruct(champ, back)
+
+    @_profiled("optimize_pool_bracket")
+    def optimize_pool_bracket(
+        self,
+        pool_size: int,
+        public: Optional["BracketSimulator"] = None,
+        candidates: Any = 64,
+        n: int = 10000,
+        scoring: Optional[Sequence[float]] = None,
+        seed: Any = None,
+        workers: Optional[int] = None,
+        shard_size: int = POOL_SHARD,
+    ) -> PoolResult:
+        """Search for the bracket most likely to finish first in a pool.
 
-    def probability_of_each_team(self) -> Dict[Team, float]:
+        ``n`` tournaments are sampled from this simulator and, for each of
+        them, a field of ``pool_size - 1`` opponent brackets is sampled from
+        ``public`` (a simulator over the same teams built from public pick
+        rates; defaults to this one).  Every candidate is scored with the
+        round weights ``scoring`` (default ``1, 2, 4, ...``; one weight per
+        real round, play-ins score nothing) against the same tournaments and
+        fields; it wins a tournament outright when it beats the best opponent
+        and gets ``1 / (ties + 1)`` of a win when it ties.
+
+        ``candidates`` is either an array of winners arrays or the number of
+        candidates to generate: the expected-score and maximum-likelihood
+        brackets, the next most likely brackets and brackets sampled from
+        this simulator for contrarian picks.  Shards of ``shard_size``
+        tournaments run as in :meth:`simulate_counts` (in-process unless
+        ``workers`` is greater than one), so the result for a given ``seed``
+        does not depend on ``workers``.
+        """
+        public = self if public is None else public
+        if list(public.teams) != list(self.teams):
+            raise ValueError("The public pick simulator must use the same teams")
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        seeds = np.random.SeedSequence(seed)
+        if isinstance(candidates, (int, np.integer)):
+            candidates = self._pool_candidates(int(candidates), seeds.spawn(1)[0])
+        candidates = np.asarray(candidates, dtype=self._index_dtype())
+        scoring = self._round_weights(scoring)
+
+        sizes = [min(shard_size, n - start) for start in range(0, n, shard_size)]
+        shards = list(zip(seeds.spawn(len(sizes)), sizes))
+        job = (public, candidates, scoring, pool_size - 1)
+        wins = np.zeros(len(candidates))
+        if workers is None or workers <= 1 or len(shards) <= 1:
+            for shard in shards:
+                wins += self._pool_shard(*job, shard)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker, initargs=(self, job)) as pool:
+                for shard_wins in pool.map(_pool_worker_shard, shards):
+                    wins += shard_wins
+        probs = wins / n
+        best = int(probs.argmax())
+        return PoolResult(candidates[best], float(probs[best]), candidates, probs)
+
+    def _round_weights(self, scoring: Optional[Sequence[float]]) -> np.ndarray:
+        """Weights for every slot-bracket round from weights for the real rounds.
+
+        Play-in rounds (:attr:`play_in_rounds`) get weight 0; ``None`` means
+        ``1, 2, 4, ...`` over the real rounds.
+        """
+        real = self.topology.rounds - self.play_in_rounds
+        weights = 2 ** np.arange(real) if scoring is None else np.asarray(scoring)
+        if weights.shape != (real,):
+            raise ValueError(f"Expected {real} round weights, one per round after the play-ins")
+        return np.concatenate([np.zeros(self.play_in_rounds, dtype=weights.dtype), weights])
+
+    def _pool_candidates(self, count: int, seq: np.random.SeedSequence) -> np.ndarray:
+        """Generate ``count`` distinct candidate brackets for the pool search."""
+        picks = [self.best_expected_score_bracket()[2], self.most_likely_bracket()[2]]
+        picks += [w for _, w in self.top_k_brackets(max(1, count // 2))]
+        sampled = self.simulate(count, seed=seq)
+        stacked = np.concatenate([np.stack(picks).astype(sampled.dtype), sampled])
+        _, first = np.unique(stacked, axis=0, return_index=True)
+        return stacked[np.sort(first)[:count]]
+
+    def _pool_shard(
+        self,
+        public: "BracketSimulator",
+        candidates: np.ndarray,
+        scoring: Optional[Sequence[float]],
+        opponents: int,
+        shard: Tuple[np.random.SeedSequence, int],
+    ) -> np.ndarray:
+        """Summed first-place shares of every candidate over one shard."""
+        seq, size = shard
+        rng = np.random.default_rng(seq)
+        games = len(self.teams) - 1
+        wins = np.zeros(len(candidates))
+        step = max(1, SIMULATION_CHUNK // max(1, opponents))
+        for start in range(0, size, step):
+            batch = min(step, size - start)
+            outcomes = np.empty((batch, games), dtype=self._index_dtype())
+            self._sample_into(rng, outcomes)
+            if opponents:
+                field = np.empty((batch * opponents, games), dtype=outcomes.dtype)
+                public._sample_into(rng, field)
+                # candidates and opponents go through one product, so equal
+                # picks get bit-identical scores even with fractional weights
+                entries = np.concatenate(
+                    [np.broadcast_to(candidates, (batch,) + candidates.shape), field.reshape(batch, opponents, games)],
+                    axis=1,
+                )
+                all_scores = score_fields(entries, outcomes, scoring)
+                cand, scores = all_scores[:, : len(candidates)], all_scores[:, len(candidates) :]
+                top = scores.max(axis=1)[:, None]
+                ties = (scores == top).sum(axis=1)[:, None]
+                wins += np.where(cand > top, 1.0, np.where(cand == top, 1.0 / (ties + 1), 0.0)).sum(axis=0)
+            else:
+                wins += batch
+        return wins
+
+    def probability_of_each_team(self, log_space: bool = False) -> Dict[Team, float]:
         """Compute the marginal probability that each team wins the tournament.
 
         Unlike :meth:`most_likely_bracket`, which builds a *maximum-likelihood*
         bracket, this method returns the actual probability of each team
         emerging from the entire bracket.  It therefore sums over all possible
-        ways the team can reach the end.
-        """
-        return self._marginals_dp(self.teams)
-
-    def _marginals_dp(self, teams: List[Team]) -> Dict[Team, float]:
-        """Recursive computation of true win probabilities for each team.
-
-        The returned dictionary maps every team present in ``teams`` to the
-        probability that it wins the subtree.  This routine simply convolves
-        the distributions of the left and right halves using the pairwise
-        win-probabilities.
-        """
-        if len(teams) == 1:
-            return {teams[0]: 1.0}
-        half = len(teams) // 2
-        left = self._marginals_dp(teams[:half])
-        right = self._marginals_dp(teams[half:])
-        dist: Dict[Team, float] = {}
-        for a, pa in left.items():
-            for b, pb in right.items():
-                p_a_wins = self._p(a, b)
-                dist[a] = dist.get(a, 0.0) + pa * pb * p_a_wins
-                dist[b] = dist.get(b, 0.0) + pa * pb * (1 - p_a_wins)
-        return dist
+        ways the team can reach the end.  ``log_space=True`` returns natural
+        log-probabilities computed with log-sum-exp.
+        """
+        dist = self._marginals_dp(log_space)[:, -1]
+        return {t: float(p) for t, p in zip(self.teams, dist) if t is not None}
+
+    def round_probabilities(self, log_space: bool = False) -> np.ndarray:
+        """Return the probability that each team wins each round.
+
+        The result has shape ``(len(teams), rounds)``; entry ``[i, r]`` is the
+        probability that ``teams[i]`` wins its game in round ``r + 1`` and
+        thereby reaches the following round.  For a 64-team field column 1
+        is the Sweet 16, column 3 the Final Four and the last column is the
+        championship (identical to :meth:`probability_of_each_team`).
+        Columns cover every round of the slot bracket: with play-in games
+        the first :attr:`play_in_rounds` columns are the play-ins, so round
+        ``r`` of :meth:`lock_result` is column ``r - 1 + play_in_rounds``.
+        ``log_space=True`` returns natural log-probabilities instead.
+        """
+        return self._marginals_dp(log_space)
+
+    @_profiled("scenario_round_probabilities")
+    def scenario_round_probabilities(self, matrices: np.ndarray, log_space: bool = False) -> np.ndarray:
+        """Evaluate :meth:`round_probabilities` for a stack of probability matrices.
+
+        ``matrices`` has shape ``(scenarios, n, n)`` with every slice laid
+        out like :attr:`matrix`, e.g. one per rating system or injury
+        adjustment.  All scenarios go through each round together as one
+        batched kernel call, in chunks bounded by
+        :data:`SCENARIO_CHUNK_BYTES`.  Locked results apply to every
+        scenario.  Returns an array of shape ``(scenarios, n, rounds)``.
+        """
+        n = len(self.teams)
+        if not isinstance(matrices, np.ndarray):
+            # memmapped stacks are gathered from chunk by chunk
+            matrices = np.asarray(matrices, dtype=np.float64)
+        if matrices.ndim != 3 or matrices.shape[1:] != (n, n):
+            raise ValueError(f"Expected a stack of {n}x{n} probability matrices")
+        rounds = n.bit_length() - 1
+        out = np.empty((len(matrices), n, rounds))
+        # the blocks of all rounds hold n * n / 2 probabilities per scenario
+        step = max(1, SCENARIO_CHUNK_BYTES // (4 * n * n))
+        for start in range(0, len(matrices), step):
+            out[start : start + step] = self._scenario_chunk(matrices[start : start + step], log_space)
+        return out
+
+    def _scenario_chunk(self, matrices: np.ndarray, log_space: bool) -> np.ndarray:
+        n = len(self.teams)
+        s = len(matrices)
+        forced = self._forced_winners()
+        values = np.zeros((s, n)) if log_space else np.ones((s, n))
+        columns = []
+        blocks = []
+        half = 1
+        r = 0
+        while half < n:
+            rows, cols = self.topology.round_block(r)
+            block = np.asarray(matrices[:, rows, cols], dtype=np.float64)
+            if self._is_bye is not None:
+                block = _apply_byes(block, rows, cols, self._is_bye)
+            blocks.append(block)
+            sides = values.reshape(s, -1, 2, half)
+            if log_space:
+                with np.errstate(divide="ignore"):
+                    new_sides = _logsum_round(sides, np.log(block), np.log1p(-block))
+            else:
+                new_sides = _sum_round(sides, block)
+            for g, w in forced[r].items():
+                keep = np.zeros(2 * half, dtype=bool)
+                keep[w - g * 2 * half] = True
+                keep = keep.reshape(2, half)
+                if log_space:
+                    sub = np.where(keep, new_sides[:, g], -np.inf)
+                    new_sides[:, g] = sub - _logsumexp(sub.reshape(s, -1), axis=1)[:, None, None]
+                else:
+                    sub = np.where(keep, new_sides[:, g], 0.0)
+                    total = sub.sum(axis=(1, 2))
+                    if not np.all(total > 0):
+                        raise ValueError("Locked results have probability zero")
+                    new_sides[:, g] = sub / total[:, None, None]
+            values = new_sides.reshape(s, n)
+            columns.append(values)
+            half *= 2
+            r += 1
+        table = np.stack(columns, axis=2)
+        if not log_space:
+            return _condition_on_locks(table, forced, lambda r: blocks[r], False)
+
+        def log_blocks(r: int) -> Tuple[np.ndarray, np.ndarray]:
+            with np.errstate(divide="ignore"):
+                return np.log(blocks[r]), np.log1p(-blocks[r])
+
+        return _condition_on_locks(table, forced, log_blocks, True)
+
+    def _round_block(self, half: int, games: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return the win-probability blocks for the games of one round.
+
+        In the round where each side of a game holds ``half`` teams, game
+        ``g`` pits slots ``[2*g*half, (2*g+1)*half)`` against the following
+        ``half`` slots.  The result has shape ``(games, half, half)`` with
+        ``block[g, i, j]`` the probability that left team ``i`` beats right
+        team ``j``.  ``games`` restricts the result to those game numbers.
+        Blocks come from :attr:`block_cache`, so every pass shares one
+        gather per round.
+        """
+        block = self._cached_round(half)["block"]
+        return block if games is None else block[games]
+
+    def _log_round_block(self, half: int, games: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``log(block)`` and ``log(1 - block)`` for :meth:`_round_block`."""
+        entry = self._cached_round(half)
+        if "log_win" not in entry:
+            with np.errstate(divide="ignore"):
+                entry["log_win"] = np.log(entry["block"])
+                entry["log_lose"] = np.log1p(-entry["block"])
+            self.block_cache.put(half, self._version, entry)
+        if games is None:
+            return entry["log_win"], entry["log_lose"]
+        return entry["log_win"][games], entry["log_lose"][games]
+
+    def _lookup(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Gather ``matrix[rows, cols]`` as float64 with games against byes decided."""
+        probs = np.asarray(self.matrix[rows, cols], dtype=np.float64)
+        if self._is_bye is not None:
+            probs = _apply_byes(probs, rows, cols, self._is_bye)
+        return probs
+
+    def _cached_round(self, half: int) -> Dict[str, np.ndarray]:
+        entry = self.block_cache.get(half, self._version)
+        if entry is None:
+            rows, cols = self.topology.round_block(half.bit_length() - 1)
+            with _phase("dp.gather"):
+                entry = {"block": self._lookup(rows, cols)}
+            _count("matrix_lookups", entry["block"].size)
+            self.block_cache.put(half, self._version, entry)
+        return entry
+
+    def _marginals_dp(self, log_space: bool = False) -> np.ndarray:
+        """Bottom-up computation of true win probabilities for each team.
+
+        Each round keeps a vector with the probability that every team wins
+        its subtree so far.  A game combines the left and right halves with
+        one batched matrix-vector product per side:
+        ``left * (B @ right)`` and ``right * ((1 - B).T @ left)``.  The vector
+        after every round is kept, giving a ``(teams, rounds)`` table.
+
+        With ``log_space`` the same recurrence is evaluated on
+        log-probabilities, replacing the products by log-sum-exp reductions.
+        Locked results are then applied to the earlier rounds as well, see
+        :meth:`_conditioned`.
+        """
+        values = np.stack(self._solve_pass("logsum" if log_space else "sum").values, axis=1)
+        return self._conditioned(values, log_space)
+
+    def _conditioned(self, values: np.ndarray, log_space: bool) -> np.ndarray:
+        """Apply :func:`_condition_on_locks` to a ``(teams, rounds)`` marginal table."""
+        if not self._locks:
+            return values
+        if log_space:
+            return _condition_on_locks(values, self._forced_winners(), lambda r: self._log_round_block(1 << r), True)
+        return _condition_on_locks(values, self._forced_winners(), lambda r: self._round_block(1 << r), False)
+
+    def _solve_pass(self, kind: str) -> "_PassTables":
+        """Bring the cached tables of one DP pass up to date and return them.
+
+        ``kind`` is ``"sum"`` (marginals), ``"logsum"`` (marginals in log
+        space) or ``"max"`` (log-space max-product with back-pointers).  Each
+        pass keeps one ``(teams,)`` vector per round plus a flag per game
+        telling whether it is out of date; only flagged games are recomputed,
+        all games of a round in one batch.
+
+        Games constrained by :meth:`lock_result` have every team but the
+        forced winner masked out.  The marginal passes then renormalize those
+        games and record the log normalizer, the probability of the locked
+        outcome given the evidence below it.  The max-product pass subtracts
+        the same normalizer, so its scores are conditional on the locks too.
+        Marginal tables only see the locks at or below each game; callers
+        apply the later ones with :func:`_condition_on_locks`.
+        """
+        return self._solve_passes((kind,))[0]
+
+    def _solve_passes(self, kinds: Sequence[str]) -> List["_PassTables"]:
+        """Update several passes of :meth:`_solve_pass` in one traversal.
+
+        Rounds are visited once and every pass is advanced on the same
+        probability blocks before moving up.  When a marginal pass runs
+        alongside the max-product pass its lock normalizers are reused
+        instead of running a separate log-sum pass.
+        """
+        n = len(self.teams)
+        all_tables = []
+        for kind in kinds:
+            tables = self._tables.get(kind)
+            if tables is None:
+                tables = self._tables[kind] = _PassTables(n, with_back=kind == "max")
+            all_tables.append(tables)
+        norm_tables = None
+        if "max" in kinds and self._locks:
+            for kind in ("logsum", "sum"):
+                if kind in kinds:
+                    norm_tables = all_tables[list(kinds).index(kind)]
+                    break
+            else:
+                norm_tables = self._solve_pass("logsum")
+        # marginal passes first so the max pass can read this round's normalizers
+        order = sorted(range(len(kinds)), key=lambda k: kinds[k] == "max")
+        forced = self._forced_winners()
+        with _phase("dp." + "+".join(kinds)):
+            for r in range(n.bit_length() - 1):
+                half = 1 << r
+                for k in order:
+                    self._advance_round(kinds[k], all_tables[k], r, half, forced[r], norm_tables)
+        return all_tables
+
+    def _advance_round(
+        self,
+        kind: str,
+        tables: "_PassTables",
+        r: int,
+        half: int,
+        forced: Dict[int, int],
+        norm_tables: Optional["_PassTables"],
+    ) -> None:
+        stale = tables.stale[r]
+        games = np.flatnonzero(stale)
+        if not games.size:
+            return
+        n = len(self.teams)
+        prev = (np.ones(n) if kind == "sum" else np.zeros(n)) if r == 0 else tables.values[r - 1]
+        sides = prev.reshape(-1, 2, half)[games]
+        if kind == "sum":
+            new_sides = _sum_round(sides, self._round_block(half, games))
+        elif kind == "logsum":
+            new_sides = _logsum_round(sides, *self._log_round_block(half, games))
+        else:
+            new_sides, opp = _max_round(sides, *self._log_round_block(half, games))
+            tables.back[r].reshape(-1, 2, half)[games] = opp + (games * 2 * half)[:, None, None]
+        tables.log_norm[r][games] = 0.0
+        locked = [(k, forced[g]) for k, g in enumerate(games) if g in forced]
+        if locked:
+            pos = np.array([k for k, _ in locked])
+            keep = np.array([w for _, w in locked]) - games[pos] * 2 * half
+            mask = np.zeros((len(locked), 2 * half), dtype=bool)
+            mask[np.arange(len(locked)), keep] = True
+            mask = mask.reshape(-1, 2, half)
+            if kind == "sum":
+                sub = np.where(mask, new_sides[pos], 0.0)
+                total = sub.sum(axis=(1, 2))
+                if not np.all(total > 0):
+                    raise ValueError("Locked results have probability zero")
+                new_sides[pos] = sub / total[:, None, None]
+                tables.log_norm[r][games[pos]] = np.log(total)
+            elif kind == "logsum":
+                sub = np.where(mask, new_sides[pos], -np.inf)
+                log_total = _logsumexp(sub.reshape(len(locked), -1), axis=1)
+                new_sides[pos] = sub - log_total[:, None, None]
+                tables.log_norm[r][games[pos]] = log_total
+            else:
+                log_total = norm_tables.log_norm[r][games[pos]]
+                new_sides[pos] = np.where(mask, new_sides[pos], -np.inf) - log_total[:, None, None]
+        tables.values[r].reshape(-1, 2, half)[games] = new_sides
+        stale[:] = False
+
+    def lock_result(self, round_num: int, game: int, winner: Team) -> None:
+        """Record the actual winner of a game that has been played.
+
+        ``round_num`` counts from 1 for the first round and ``game`` numbers
+        the games of that round from 0, left to right, so the game covers
+        slots ``[game * 2**round_num, (game + 1) * 2**round_num)``.  The winner
+        is implicitly locked into every earlier game on its path as well.
+        With play-in games the numbering is unchanged for the real rounds:
+        the play-ins are round 0 and a round-``r`` game covers
+        ``2**(r + play_in_rounds)`` slots (see :attr:`play_in_rounds`).
+
+        Marginals, :meth:`most_likely_bracket` and :meth:`top_k_brackets` are
+        conditioned exactly on all locked results; a lock also reweights the
+        rounds before it (who the winner is likely to have beaten there),
+        see :func:`_condition_on_locks`.  The sampler draws from the same
+        conditional distribution.  Only the games on the winner's path are
+        recomputed.
+        """
+        slot = self.index.get(winner)
+        if slot is None:
+            raise ValueError(f"{winner} is not in the bracket")
+        # locks are keyed by the 1-based round of the whole slot bracket
+        key = (round_num + self.play_in_rounds, game)
+        if not 1 <= key[0] <= self.topology.rounds or self.topology.game_of(slot, key[0] - 1) != game:
+            raise ValueError(f"{winner} does not play in game {game} of round {round_num}")
+        previous = self._locks.get(key)
+        self._locks[key] = slot
+        try:
+            self._forced_winners()
+        except ValueError:
+            if previous is None:
+                del self._locks[key]
+            else:
+                self._locks[key] = previous
+            raise
+        if previous is not None:
+            self._mark_path(previous, 0)
+        self._mark_path(slot, 0)
+
+    def unlock_result(self, round_num: int, game: int) -> None:
+        """Forget a result recorded with :meth:`lock_result`."""
+        slot = self._locks.pop((round_num + self.play_in_rounds, game), None)
+        if slot is None:
+            raise ValueError(f"No result is locked for game {game} of round {round_num}")
+        self._mark_path(slot, 0)
+
+    def clear_results(self) -> None:
+        """Forget every locked result."""
+        for slot in self._locks.values():
+            self._mark_path(slot, 0)
+        self._locks.clear()
+
+    def locked_results(self) -> Dict[Tuple[int, int], Team]:
+        """Return the locked results as ``{(round, game): winner}``, numbered as in :meth:`lock_result`."""
+        return {
+            (round_num - self.play_in_rounds, game): self.teams[slot]
+            for (round_num, game), slot in sorted(self._locks.items())
+        }
+
+    def _forced_winners(self) -> List[Dict[int, int]]:
+        """Winner slot of every game decided by a lock, per 0-based round.
+
+        A lock in round ``R`` forces its winner through rounds ``1..R``;
+        conflicting locks raise :class:`ValueError`.
+        """
+        forced: List[Dict[int, int]] = [{} for _ in range(self.topology.rounds)]
+        for (round_num, _), slot in self._locks.items():
+            for r in range(round_num):
+                g = self.topology.game_of(slot, r)
+                if forced[r].setdefault(g, slot) != slot:
+                    raise ValueError(
+                        f"Conflicting results for game {g} of round {r + 1 - self.play_in_rounds}: "
+                        f"{self.teams[forced[r][g]]} and {self.teams[slot]}"
+                    )
+        return forced
+
+    def set_probability(self, a: Team, b: Team, p: float) -> None:
+        """Set the probability that ``a`` beats ``b`` (and ``b`` beats ``a`` to ``1 - p``).
+
+        Only the games from the one where ``a`` and ``b`` could first meet up
+        to the championship are marked for recomputation; every other
+        subtree's cached DP tables are reused by the next query.  A matrix
+        passed to the constructor is never written to: it (like a read-only
+        memory-mapped one) is copied into memory on the first update.
+        """
+        for team in (a, b):
+            if team not in self.index:
+                raise ValueError(f"{team} is not in the bracket")
+        if not 0.0 <= p <= 1.0:
+            raise ValueError(f"Probability must be in [0, 1], got {p}")
+        i = self.index[a]
+        j = self.index[b]
+        if i == j:
+            raise ValueError("A team cannot play itself")
+        if isinstance(self.matrix, SparseProbabilities):
+            if not self._owns_matrix:
+                self.matrix = self.matrix.copy()
+                self._owns_matrix = True
+            self.matrix.set(i, j, p)
+            self.matrix.set(j, i, 1 - p)
+        else:
+            if not (self._owns_matrix and self.matrix.flags.writeable):
+                self.matrix = np.array(self.matrix)
+                self._owns_matrix = True
+            self.matrix[i, j] = p
+            self.matrix[j, i] = 1 - p
+        r = self.topology.meeting_round(i, j)
+        # patch the one cached block holding this pair; all other cached
+        # blocks stay valid under the new matrix version
+        self._version += 1
+        half = 1 << r
+        entry = self.block_cache.get(half, self._version - 1)
+        if entry is not None:
+            lo, hi = min(i, j), max(i, j)
+            g, a, b = lo // (2 * half), lo % (2 * half), hi % (2 * half) - half
+            p_lo = p if lo == i else 1 - p
+            entry["block"][g, a, b] = p_lo
+            if "log_win" in entry:
+                with np.errstate(divide="ignore"):
+                    entry["log_win"][g, a, b] = np.log(p_lo)
+                    entry["log_lose"][g, a, b] = np.log1p(-p_lo)
+        self.block_cache.restamp(self._version - 1, self._version)
+        self._mark_path(i, r)
+
+    def _mark_path(self, slot: int, first_round: int) -> None:
+        """Flag the game containing ``slot`` in ``first_round`` and every later round."""
+        for tables in self._tables.values():
+            for r in range(first_round, len(tables.stale)):
+                tables.stale[r][self.topology.game_of(slot, r)] = True
+
+    def invalidate(self) -> None:
+        """Drop all cached DP tables and probability blocks.
+
+        Call this after modifying or replacing :attr:`matrix` directly;
+        :meth:`set_probability` and :meth:`lock_result` keep the caches
+        consistent on their own.
+        """
+        self._version += 1
+        self._tables.clear()
+        self.block_cache.clear()
+
+    @_profiled("simulate")
+    def simulate(self, n: int, seed: Any = None) -> np.ndarray:
+        """Monte-Carlo sample ``n`` complete brackets.
+
+        Returns an integer array of shape ``(n, len(teams) - 1)`` holding the
+        index (into :attr:`teams`) of the winner of every game.  Games are
+        stored in heap order: column 0 is the championship, the game in
+        column ``k`` is fed by the games in columns ``2k + 1`` and ``2k + 2``,
+        and the first-round games occupy the last ``len(teams) // 2``
+        columns from left to right.
+
+        ``seed`` is passed to :func:`numpy.random.default_rng`, so the same
+        seed always produces the same brackets.
+        """
+        rng = np.random.default_rng(seed)
+        out = np.empty((n, len(self.teams) - 1), dtype=self._index_dtype())
+        for start in range(0, n, SIMULATION_CHUNK):
+            stop = min(n, start + SIMULATION_CHUNK)
+            self._sample_into(rng, out[start:stop])
+        return out
+
+    @_profiled("simulate_counts")
+    def simulate_counts(
+        self,
+        n: int,
+        seed: Any = None,
+        workers: Optional[int] = None,
+        shard_size: int = SIMULATION_SHARD,
+    ) -> np.ndarray:
+        """Simulate ``n`` brackets and count how often each team wins each round.
+
+        The work is split into shards of ``shard_size`` brackets, each with its
+        own generator spawned from ``numpy.random.SeedSequence(seed)``.  Shards
+        are run in-process unless ``workers`` is greater than one, in which
+        case a :class:`~concurrent.futures.ProcessPoolExecutor` with that many
+        processes runs them and only their count tables are sent back, so the
+        result for a given ``seed`` and ``shard_size`` is bit-identical
+        whatever the number of workers.
+
+        Returns an int64 array shaped like :meth:`round_probabilities`, play-in
+        rounds included.
+        """
+        sizes = [min(shard_size, n - start) for start in range(0, n, shard_size)]
+        shards = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+        counts = np.zeros((len(self.teams), self.topology.rounds), dtype=np.int64)
+        if workers is None or workers <= 1 or len(shards) <= 1:
+            for shard in shards:
+                counts += self._count_shard(shard)
+            return counts
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as pool:
+            for shard_counts in pool.map(_count_worker_shard, shards):
+                counts += shard_counts
+        return counts
+
+    def advancement_counts(self, outcomes: np.ndarray) -> np.ndarray:
+        """Count round wins per team in an array returned by :meth:`simulate`."""
+        n = len(self.teams)
+        counts = np.empty((n, self.topology.rounds), dtype=np.int64)
+        for r in range(self.topology.rounds):
+            start, stop = self.topology.round_columns(r)
+            counts[:, r] = np.bincount(outcomes[:, start:stop].ravel(), minlength=n)
+        return counts
+
+    def _count_shard(self, shard: Tuple[np.random.SeedSequence, int]) -> np.ndarray:
+        seq, size = shard
+        rng = np.random.default_rng(seq)
+        counts = 0
+        buf = np.empty((min(size, SIMULATION_CHUNK), len(self.teams) - 1), dtype=self._index_dtype())
+        for start in range(0, size, SIMULATION_CHUNK):
+            out = buf[: min(SIMULATION_CHUNK, size - start)]
+            self._sample_into(rng, out)
+            counts = counts + self.advancement_counts(out)
+        return counts
+
+    def _index_dtype(self) -> np.dtype:
+        """Smallest integer type able to hold a team index."""
+        return np.dtype(np.int16 if len(self.teams) <= np.iinfo(np.int16).max else np.int32)
+
+    def _sample_into(self, rng: np.random.Generator, out: np.ndarray) -> None:
+        """Fill ``out`` (shape ``(batch, teams - 1)``) with sampled winners.
+
+        Every round draws one uniform matrix for all games of all brackets in
+        the batch and keeps the left team wherever the draw falls below its
+        win probability.  First-round matchups are fixed, so that round uses
+        a single probability vector instead of a gather.  With results locked
+        by :meth:`lock_result` the brackets come from
+        :meth:`_sample_conditioned` instead.
+        """
+        if self._locks:
+            self._sample_conditioned(rng, out)
+            return
+        batch = out.shape[0]
+        topo = self.topology
+        left, right = topo.lo[topo.round == 0].astype(out.dtype), topo.mid[topo.round == 0].astype(out.dtype)
+        p = self._lookup(left, right)
+        for r in range(topo.rounds):
+            start, stop = topo.round_columns(r)
+            alive = np.where(rng.random((batch, stop - start)) < p, left, right)
+            out[:, start:stop] = alive
+            left = alive[:, 0::2]
+            right = alive[:, 1::2]
+            if r + 1 < topo.rounds:
+                p = self._lookup(left, right)
+
+    def _sample_conditioned(self, rng: np.random.Generator, out: np.ndarray) -> None:
+        """Sample brackets top-down from the distribution conditioned on locks.
+
+        A later lock also tells us about the games before it, so winners
+        cannot simply be forced into their columns.  Instead the champion is
+        drawn from the conditioned final column and, round by round
+        downwards, each game's winner ``w`` draws its opponent ``b`` from the
+        other side with weight ``inside[b] * P(w beats b)``, where
+        ``inside`` is the sum pass's probability (with locks applied) that
+        ``b`` wins its side.  That is exactly the distribution of the
+        opponent given ``w`` won and every locked result.
+        """
+        topo = self.topology
+        n = len(self.teams)
+        inside = [np.ones(n)] + self._solve_pass("sum").values
+        # keep the (brackets, games, half) weight arrays to a few MiB
+        step = max(1, (1 << 22) // n)
+        for b0 in range(0, out.shape[0], step):
+            part = out[b0 : b0 + step]
+            batch = part.shape[0]
+            winners = _draw(rng, inside[-1], (batch, 1))
+            for r in range(topo.rounds - 1, -1, -1):
+                start, stop = topo.round_columns(r)
+                part[:, start:stop] = winners
+                half = 1 << r
+                lo = np.arange(stop - start) * 2 * half
+                on_right = winners - lo >= half
+                cands = np.where(on_right, lo, lo + half)[..., None] + np.arange(half)
+                if half == 1:
+                    opponents = cands[..., 0]
+                else:
+                    weights = inside[r][cands] * self._lookup(winners[..., None], cands)
+                    opponents = np.take_along_axis(cands, _draw(rng, weights, winners.shape)[..., None], axis=-1)[..., 0]
+                left = np.where(on_right, opponents, winners)
+                right = np.where(on_right, winners, opponents)
+                winners = np.stack([left, right], axis=-1).reshape(batch, -1)
 
     @staticmethod
-    def flatten_structure(struct: Any, prefix: List[str] = None) -> List[Tuple[int, Team]]:
-        """Flatten the nested "structure" returned by ``_dp``.
-
-        Returns a list of tuples ``(round_number, winner)`` ordered from the
-        earliest rounds to the championship.  Round numbers start at 1 for the
-        first set of games in the subtree.
-        """
-        if prefix is None:
-            prefix = []
-        if struct is None:
-            return []
-        res: List[Tuple[int, Team]] = []
-        # recursively flatten left and right
-        res.extend(BracketSimulator.flatten_structure(struct["left"], prefix))
-        res.extend(BracketSimulator.flatten_structure(struct["right"], prefix))
-        res.append((len(prefix) + 1, struct["winner"]))
-        return res
+    def flatten_structure(
+        struct: np.ndarray, teams: Sequence[Optional[Team]], play_in_rounds: int = 0
+    ) -> List[Tuple[int, Team]]:
+        """Flatten a heap-ordered winners array into ``(round_number, winner)``.
+
+        The list is ordered from the earliest round to the championship and
+        left to right within a round.  Round numbers are those of
+        :meth:`structure_matches`.
+        """
+        matches = BracketSimulator.structure_matches(struct, teams, play_in_rounds)
+        return [(rnd, w) for rnd, _, _, w in matches]
 
     @staticmethod
-    def structure_matches(struct: Any, size: int) -> List[Tuple[int, Team, Team, Team]]:
-        """Return a list of explicit matches from the DP structure.
-
-        Each entry is ``(round, team_left, team_right, winner)``.  The ``size``
-        argument should be the number of teams in the subtree represented by
-        ``struct``; it is used to compute the round number as ``log2(size)``.
-        """
-        if struct is None or size <= 1:
-            return []
-        half = size // 2
-        matches: List[Tuple[int, Team, Team, Team]] = []
-        matches.extend(BracketSimulator.structure_matches(struct["left"], half))
-        matches.extend(BracketSimulator.structure_matches(struct["right"], half))
-        left_w = struct["left"]["winner"]
-        right_w = struct["right"]["winner"]
-        round_num = int(math.log2(size))
-        matches.append((round_num, left_w, right_w, struct["winner"]))
-        return matches
+    @_profiled("structure_matches")
+    def structure_matches(
+        struct: np.ndarray, teams: Sequence[Optional[Team]], play_in_rounds: int = 0
+    ) -> List[Tuple[int, Team, Team, Team]]:
+        """Return a list of explicit matches from a heap-ordered winners array.
+
+        Each entry is ``(round, team_left, team_right, winner)``, ordered from
+        the first round to the championship.  ``teams`` is the bracket-ordered
+        team list the indices in ``struct`` refer to; games involving a bye
+        (``None``) are left out.  Rounds count from 1 for the first real
+        round; pass the simulator's :attr:`play_in_rounds` to number the
+        play-in games as round 0.
+        """
+        topo = BracketTopology.of(len(struct) + 1)
+        # winners of every heap node, followed by the leaves (slot i holds team i)
+        nodes = np.concatenate([np.asarray(struct), np.arange(topo.n)])
+        games = topo.order
+        rows = zip(
+            (topo.round[games] + 1 - play_in_rounds).tolist(),
+            nodes[topo.left[games]].tolist(),
+            nodes[topo.right[games]].tolist(),
+            nodes[games].tolist(),
+        )
+        return [
+            (rnd, teams[a], teams[b], teams[w])
+            for rnd, a, b, w in rows
+            if teams[a] is not None and teams[b] is not None
+        ]
+
+
+def _k_best_side(
+    scores: np.ndarray,
+    own_lo: int,
+    opp_lo: int,
+    log_p: np.ndarray,
+    k: int,
+    out_scores: np.ndarray,
+    out_back: np.ndarray,
+) -> None:
+    """k-best merge for the teams on one side of a single game.
+
+    ``scores[t]`` holds the sorted log-scores of the best sub-brackets won by
+    team ``t`` in the previous round and ``log_p[a, b]`` is the log-probability
+    that own team ``own_lo + a`` beats opponent ``opp_lo + b``.  Each
+    opponent contributes a sorted grid of ``own + opp + log_p`` sums; the
+    grids are merged lazily with a heap that starts from the ``k`` best grid
+    corners and only expands an entry's neighbours once it is popped.
+    """
+    half = log_p.shape[0]
+    width = scores.shape[1]
+    own = scores[own_lo : own_lo + half].tolist()
+    opp = scores[opp_lo : opp_lo + half].tolist()
+    corners = scores[own_lo : own_lo + half, :1] + scores[opp_lo : opp_lo + half, 0] + log_p
+    m = min(k, half)
+    for a in range(half):
+        row = corners[a]
+        top = np.argpartition(-row, m - 1)[:m] if m < half else range(half)
+        heap = [(-float(row[b]), int(b), 0, 0) for b in top]
+        heapq.heapify(heap)
+        filled = 0
+        while heap and filled < k:
+            neg, b, i, j = heapq.heappop(heap)
+            if neg == np.inf:
+                break
+            out_scores[own_lo + a, filled] = -neg
+            out_back[own_lo + a, filled] = (opp_lo + b, i, j)
+            filled += 1
+            # visit every (i, j) once: step j freely, step i only along j == 0
+            if j + 1 < width:
+                heapq.heappush(heap, (-(own[a][i] + opp[b][j + 1] + log_p[a, b]), b, i, j + 1))
+            if j == 0 and i + 1 < width:
+                heapq.heappush(heap, (-(own[a][i + 1] + opp[b][0] + log_p[a, b]), b, i + 1, 0))
+
+
+# team index used by CSV parsing workers; set once per worker process
+_WORKER_INDEX: Dict[Team, int] = {}
+
+
+def _init_csv_worker(index: Dict[Team, int]) -> None:
+    global _WORKER_INDEX
+    _WORKER_INDEX = index
+
+
+def _parse_csv_worker_chunk(lines: List[bytes]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, CsvChunkStats]:
+    return _parse_csv_chunk(lines, _WORKER_INDEX)
+
+
+# simulator shared by the shard workers of a process pool; set once per
+# worker by the pool initializer so the matrix is not re-sent with every shard
+_WORKER_SIM: Optional[BracketSimulator] = None
+
+
+def _init_worker(sim: BracketSimulator) -> None:
+    global _WORKER_SIM
+    _WORKER_SIM = sim
+
+
+def _count_worker_shard(shard: Tuple[np.random.SeedSequence, int]) -> np.ndarray:
+    return _WORKER_SIM._count_shard(shard)
+
+
+_WORKER_POOL: Optional[Tuple[BracketSimulator, Tuple[Any, ...]]] = None
+
+
+def _init_pool_worker(sim: BracketSimulator, job: Tuple[Any, ...]) -> None:
+    global _WORKER_POOL
+    _WORKER_POOL = (sim, job)
+
+
+def _pool_worker_shard(shard: Tuple[np.random.SeedSequence, int]) -> np.ndarray:
+    sim, job = _WORKER_POOL
+    return sim._pool_shard(*job, shard)
 
 
 # A simple CLI demonstration when run as a script.
@@ -185,20 +2068,59 @@ if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description="Analyze a 64-team bracket.")
-    parser.add_argument("--teams", help="path to newline-separated team list", required=True)
-    parser.add_argument("--probs", help="CSV with pairwise probabilities", required=True)
+    parser.add_argument("--teams", help="teams file: one team, BYE or play-in A/B per line", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--probs", help="CSV with pairwise probabilities")
+    source.add_argument("--ratings", help="CSV with one team,rating row per team")
+    parser.add_argument("--link", default="logistic", choices=sorted(LINK_FUNCTIONS), help="link used with --ratings")
+    parser.add_argument("--scale", type=float, default=None, help="rating-difference scale used with --ratings")
+    parser.add_argument("--cache", action="store_true", help="reuse a binary cache of the CSV next to it")
+    parser.add_argument("--simulate", type=int, default=0, help="number of Monte-Carlo brackets to sample")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for --simulate")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for CSV parsing and --simulate")
+    parser.add_argument("--verbose", action="store_true", help="report CSV loading progress on stderr")
+    parser.add_argument("--profile", action="store_true", help="print per-phase timings and memory use on stderr")
     args = parser.parse_args()
 
-    with open(args.teams) as f:
-        tm = [line.strip() for line in f if line.strip()]
+    profile = contextlib.ExitStack()
+    prof = profile.enter_context(profiling()) if args.profile else None
 
-    sim = BracketSimulator.load_from_csv(tm, args.probs)
-    champ, prob, struct = sim.most_likely_bracket()
-    print(f"Most likely champion: {champ} (p={prob:.4f})")
+    tm = read_teams(args.teams)
+
+    report = None
+    if args.verbose:
+        import sys
+
+        def report(stats: CsvChunkStats) -> None:
+            print(
+                f"chunk {stats.chunk}: {stats.rows} rows ({stats.rows_per_second:,.0f}/s), "
+                f"{stats.skipped} skipped, {stats.rejected} rejected",
+                file=sys.stderr,
+            )
+
+    if args.ratings:
+        sim = BracketSimulator.load_from_ratings_csv(tm, args.ratings, args.link, args.scale, on_chunk=report)
+    elif args.cache:
+        sim = BracketSimulator.load_cached(tm, args.probs)
+    else:
+        sim = BracketSimulator.load_from_csv(tm, args.probs, workers=args.workers, on_chunk=report)
+    result = sim.solve()
+    print(f"Most likely champion: {result.champion} (p={result.probability:.4f})")
     print("Probability each team wins:")
-    for t, p in sorted(sim.probability_of_each_team().items(), key=lambda x: -x[1]):
+    for t, p in sorted(result.marginals.items(), key=lambda x: -x[1]):
         print(f"  {t}: {p:.4f}")
     print("\nPredicted match results:")
-    matches = BracketSimulator.structure_matches(struct, len(tm))
+    matches = BracketSimulator.structure_matches(result.winners, sim.teams, sim.play_in_rounds)
     for rnd, a, b, w in matches:
-        print(f"Round {rnd}: {a} vs {b} -> {w}")
+        print(f"{f'Round {rnd}' if rnd >= 1 else 'Play-in'}: {a} vs {b} -> {w}")
+    if args.simulate:
+        counts = sim.simulate_counts(args.simulate, seed=args.seed, workers=args.workers)
+        print(f"\nSimulated championship frequency ({args.simulate} brackets):")
+        for i in np.argsort(-counts[:, -1], kind="stable"):
+            if sim.teams[i] is not None:
+                print(f"  {sim.teams[i]}: {counts[i, -1] / args.simulate:.4f}")
+    profile.close()
+    if prof is not None:
+        import sys
+
+        print(prof.report(), file=sys.stderr)
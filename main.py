@@ -25,15 +25,17 @@ from PyQt5.QtWidgets import (
     QDialog,
 )
 
-from bracket import BracketSimulator
+from bracket import BracketSimulator, Entry, read_teams
+from topology import BracketTopology
 
 
 class BracketWidget(QWidget):
     """Widget that renders a graphical bracket tree.
 
-    The layout is computed from the nested ``structure`` produced by the
-    simulator.  Team images may be supplied; if present they are drawn next
-    to the team names.
+    The layout is computed from the heap-ordered winners array produced by
+    the simulator, walking the games through its :class:`BracketTopology`.
+    Team images may be supplied; if present they are drawn next to the team
+    names.
     """
 
     def __init__(self, parent=None):
@@ -45,6 +47,7 @@ class BracketWidget(QWidget):
         self.node_coords: Dict[str, Tuple[float, float]] = {}
         self.lines: List[Tuple[str, str]] = []
         self.depth = 0
+        self.topology = None
         self.h_spacing = 150
         self.v_spacing = 80
 
@@ -53,11 +56,12 @@ class BracketWidget(QWidget):
         self.structure = struct
         self.images = images
         # compute depth and reset layout state
-        self.depth = self._compute_depth(struct)
+        self.topology = BracketTopology.of(len(struct) + 1)
+        self.depth = self.topology.rounds
         self.node_coords.clear()
         self.lines.clear()
         self.current_y = 50  # running vertical position for leaves
-        self._layout(struct, 0)
+        self._layout(0, 0)
         # width equal to number of rounds
         width = (self.depth + 1) * self.h_spacing + 200
         # height based on used vertical space instead of team count
@@ -65,31 +69,38 @@ class BracketWidget(QWidget):
         self.setMinimumSize(width, height)
         self.update()
 
-    def _compute_depth(self, struct: Any) -> int:
-        if struct is None or struct.get("left") is None:
-            return 0
-        return 1 + max(self._compute_depth(struct["left"]), self._compute_depth(struct["right"]))
+    def _winner(self, node: int) -> str:
+        # heap nodes past the last game are the leaves, one per bracket slot
+        n_games = self.topology.n_games
+        if node >= n_games:
+            return self.teams[node - n_games]
+        return self.teams[self.structure[node]]
 
-    def _layout(self, struct: Any, round_num: int) -> float:
+    def _layout(self, node: int, round_num: int) -> float:
         # returns y coordinate for this node; performs in-order traversal
-        if struct is None:
-            return 0
         # leaf
-        if struct.get("left") is None and struct.get("right") is None:
+        if node >= self.topology.n_games:
             y = self.current_y
             # leaf x-position: far left (round_num determines depth but leaves at 0)
             x = (self.depth - round_num) * self.h_spacing
-            self.node_coords[struct["winner"]] = (x, y)
-            self.current_y += self.v_spacing
+            team = self._winner(node)
+            if team is not None:  # byes (None) are not drawn
+                self.node_coords[team] = (x, y)
+                self.current_y += self.v_spacing
             return y
         # internal node: layout children first
-        y_l = self._layout(struct["left"], round_num + 1)
-        y_r = self._layout(struct["right"], round_num + 1)
+        left, right = int(self.topology.left[node]), int(self.topology.right[node])
+        y_l = self._layout(left, round_num + 1)
+        y_r = self._layout(right, round_num + 1)
         y = (y_l + y_r) / 2
         x = (self.depth - round_num) * self.h_spacing
-        self.node_coords[struct["winner"]] = (x, y)
-        self.lines.append((struct["left"]["winner"], struct["winner"]))
-        self.lines.append((struct["right"]["winner"], struct["winner"]))
+        winner = self._winner(node)
+        if winner is None:
+            return y
+        self.node_coords[winner] = (x, y)
+        for child in (left, right):
+            if self._winner(child) is not None:
+                self.lines.append((self._winner(child), winner))
         return y
 
     def paintEvent(self, event):
@@ -194,9 +205,14 @@ class MainWindow(QMainWindow):
         self.result_area.setReadOnly(True)
         layout.addWidget(self.result_area)
 
-        self.teams: List[str] = []
+        # bracket entries as read by bracket.read_teams (byes, play-ins)
+        self.teams: List[Entry] = []
         self.probs_file: str = ""
         self.images: Dict[str, QtGui.QPixmap] = {}
+        # kept between runs so repeated queries reuse its cached DP tables;
+        # reloaded when the CSV's size or modification time changes
+        self.sim = None
+        self._sim_source: Tuple[int, int] = (-1, -1)
         self._drag_pos = None
 
     # dragging support
@@ -217,18 +233,29 @@ class MainWindow(QMainWindow):
     def load_teams(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select teams file", "", "Text files (*.txt);;All files (*)")
         if path:
-            with open(path) as f:
-                self.teams = [line.strip() for line in f if line.strip()]
-            self.teams_path_label.setText(f"Teams: {os.path.basename(path)} ({len(self.teams)})")
+            self.teams = read_teams(path)
+            self.sim = None
+            self.teams_path_label.setText(f"Teams: {os.path.basename(path)} ({len(self._team_names())})")
             self.check_ready()
 
     def load_probs(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select probabilities CSV", "", "CSV files (*.csv);;All files (*)")
         if path:
             self.probs_file = path
+            self.sim = None
             self.probs_path_label.setText(f"Probabilities: {os.path.basename(path)}")
             self.check_ready()
 
+    def _team_names(self) -> List[str]:
+        """Names of all teams, including both sides of play-in games."""
+        names: List[str] = []
+        for entry in self.teams:
+            if isinstance(entry, tuple):
+                names.extend(entry)
+            elif entry is not None:
+                names.append(entry)
+        return names
+
     def _load_images_from_dir(self, path: str):
         """Load any image files matching team names from ``path``.
 
@@ -236,9 +263,10 @@ class MainWindow(QMainWindow):
         invoking a file dialog.
         """
         self.images.clear()
+        names = set(self._team_names())
         for fname in os.listdir(path):
             name, ext = os.path.splitext(fname)
-            if name in self.teams:
+            if name in names:
                 pix = QtGui.QPixmap(os.path.join(path, fname))
                 if not pix.isNull():
                     self.images[name] = pix
@@ -254,22 +282,32 @@ class MainWindow(QMainWindow):
         if self.teams and self.probs_file:
             self.run_btn.setEnabled(True)
 
+    def _simulator(self) -> BracketSimulator:
+        """Return the simulator for the loaded files, re-reading an edited CSV."""
+        st = os.stat(self.probs_file)
+        source = (st.st_size, st.st_mtime_ns)
+        if self.sim is None or source != self._sim_source:
+            self.sim = BracketSimulator.load_from_csv(self.teams, self.probs_file)
+            self._sim_source = source
+        return self.sim
+
     def run_simulation(self):
         try:
-            sim = BracketSimulator.load_from_csv(self.teams, self.probs_file)
-            champ, prob, struct = sim.most_likely_bracket()
-            marginals = sim.probability_of_each_team()
+            sim = self._simulator()
+            result = sim.solve()
+            struct = result.winners
 
             out: List[str] = []
-            out.append(f"Most likely champion: {champ} (p={prob:.4f})\n")
+            out.append(f"Most likely champion: {result.champion} (p={result.probability:.4f})\n")
             out.append("Probabilities of each team winning:\n")
-            for t, p in sorted(marginals.items(), key=lambda x: -x[1]):
+            for t, p in sorted(result.marginals.items(), key=lambda x: -x[1]):
                 out.append(f"  {t}: {p:.4f}")
 
             out.append("\nPredicted bracket (most likely outcomes):")
-            matches = BracketSimulator.structure_matches(struct, len(self.teams))
+            matches = BracketSimulator.structure_matches(struct, sim.teams, sim.play_in_rounds)
             for rnd, a, b, w in matches:
-                out.append(f"  Round {rnd}: {a} vs {b} -> {w}")
+                label = f"Round {rnd}" if rnd >= 1 else "Play-in"
+                out.append(f"  {label}: {a} vs {b} -> {w}")
 
             self.result_area.setText("\n".join(out))
 
@@ -277,7 +315,7 @@ class MainWindow(QMainWindow):
             dlg.setWindowTitle("Bracket visualization")
             scroll = QScrollArea(dlg)
             bracket_w = BracketWidget()
-            bracket_w.set_structure(self.teams, struct, self.images)
+            bracket_w.set_structure(sim.teams, struct, self.images)
             scroll.setWidget(bracket_w)
             scroll.setWidgetResizable(True)
             dlg_layout = QVBoxLayout(dlg)
@@ -0,0 +1,142 @@
+"""Vectorized scoring of pool entries against simulated tournament outcomes.
+
+Entries and outcomes are both heap-ordered winners arrays as returned by
+:meth:`bracket.BracketSimulator.simulate`: one row per bracket and one column
+per game, column 0 being the championship.  Scoring ``E`` entries against
+``S`` outcomes compares them in blocks of ``(entries, outcomes, games)``
+bounded by ``chunk_bytes`` and reduces each block with one matrix product
+against the per-game weights.
+"""
+from typing import Optional, Sequence
+
+import numpy as np
+
+from topology import BracketTopology
+
+# size of one boolean (entries, outcomes, games) comparison block
+SCORE_CHUNK_BYTES = 1 << 22
+
+
+def game_weights(round_weights: Optional[Sequence[float]], n_games: int) -> np.ndarray:
+    """Expand per-round points to one weight per heap-ordered game.
+
+    ``round_weights`` lists the points for a correct pick in each round,
+    first round first; ``None`` means ``1, 2, 4, ...`` (1-2-4-8-16-32 for a
+    64-team field).  Integer weights come back as an integer array so scores
+    are exact.
+
+    Rounds are those of the winners arrays, so a bracket with play-in games
+    needs a leading weight for the play-in round, e.g. ``[0, 1, 2, 4, 8, 16,
+    32]`` for a 68-team field.  :class:`bracket.BracketSimulator` takes
+    weights for the real rounds only and prepends that 0 itself.
+    """
+    rounds = (n_games + 1).bit_length() - 1
+    if n_games + 1 != 1 << rounds:
+        raise ValueError("A bracket has one game fewer than a power of two")
+    topology = BracketTopology.of(n_games + 1)
+    if round_weights is None:
+        round_weights = 2 ** np.arange(rounds)
+    weights = np.asarray(round_weights)
+    if weights.shape != (rounds,):
+        raise ValueError(f"Expected {rounds} round weights")
+    if np.all(weights == np.round(weights)):
+        weights = weights.astype(np.int64)
+    else:
+        weights = weights.astype(np.float64)
+    return weights[topology.round]
+
+
+def score_entries(
+    entries: np.ndarray,
+    outcomes: np.ndarray,
+    round_weights: Optional[Sequence[float]] = None,
+    chunk_bytes: int = SCORE_CHUNK_BYTES,
+) -> np.ndarray:
+    """Score every entry against every outcome.
+
+    Returns an ``(entries, outcomes)`` array with the points each entry
+    earns if that outcome happens, integer-valued for integer weights.
+    ``round_weights`` is as in :func:`game_weights`, including the play-in
+    round if the bracket has one.
+    """
+    entries, outcomes, weights = _prepare(entries, outcomes, round_weights)
+    scores = np.empty((len(entries), len(outcomes)), dtype=weights.dtype)
+    for e0, e1, s0, s1 in _blocks(entries, outcomes, chunk_bytes):
+        scores[e0:e1, s0:s1] = _score_block(entries[e0:e1], outcomes[s0:s1], weights)
+    return scores
+
+
+def score_histograms(
+    entries: np.ndarray,
+    outcomes: np.ndarray,
+    round_weights: Optional[Sequence[float]] = None,
+    chunk_bytes: int = SCORE_CHUNK_BYTES,
+) -> np.ndarray:
+    """Per-entry distribution of scores over all outcomes.
+
+    Returns an int64 ``(entries, max_score + 1)`` array where
+    ``counts[e, v]`` is the number of outcomes in which entry ``e`` scores
+    exactly ``v`` points.  Only the counts are kept, so memory does not grow
+    with the number of outcomes.  Requires non-negative integer weights.
+    """
+    entries, outcomes, weights = _prepare(entries, outcomes, round_weights)
+    if weights.dtype.kind != "i" or np.any(weights < 0):
+        raise ValueError("Score histograms need non-negative integer round weights")
+    width = int(weights.sum()) + 1
+    counts = np.zeros((len(entries), width), dtype=np.int64)
+    for e0, e1, s0, s1 in _blocks(entries, outcomes, chunk_bytes):
+        block = _score_block(entries[e0:e1], outcomes[s0:s1], weights)
+        flat = block + (np.arange(e1 - e0) * width)[:, None]
+        counts[e0:e1] += np.bincount(flat.ravel(), minlength=(e1 - e0) * width).reshape(-1, width)
+    return counts
+
+
+def score_fields(
+    fields: np.ndarray,
+    outcomes: np.ndarray,
+    round_weights: Optional[Sequence[float]] = None,
+) -> np.ndarray:
+    """Score a separate field of entries per outcome against that outcome.
+
+    ``fields`` has shape ``(outcomes, entries, games)``, e.g. the opponents
+    sampled for each simulated tournament of a pool.  Returns an
+    ``(outcomes, entries)`` array, integer-valued for integer weights.
+    """
+    fields = np.asarray(fields)
+    outcomes = np.atleast_2d(np.asarray(outcomes))
+    if fields.ndim != 3 or fields.shape[0] != len(outcomes) or fields.shape[2] != outcomes.shape[1]:
+        raise ValueError("Expected one (entries, games) field per outcome")
+    return _score_fields(fields, outcomes, game_weights(round_weights, outcomes.shape[1]))
+
+
+def _prepare(entries: np.ndarray, outcomes: np.ndarray, round_weights: Optional[Sequence[float]]):
+    entries = np.atleast_2d(np.asarray(entries))
+    outcomes = np.atleast_2d(np.asarray(outcomes))
+    if entries.shape[1] != outcomes.shape[1]:
+        raise ValueError("Entries and outcomes must have the same number of games")
+    return entries, outcomes, game_weights(round_weights, entries.shape[1])
+
+
+def _blocks(entries: np.ndarray, outcomes: np.ndarray, chunk_bytes: int):
+    """Yield ``(e0, e1, s0, s1)`` ranges whose comparison fits in ``chunk_bytes``."""
+    games = entries.shape[1]
+    s_step = max(1, min(len(outcomes), chunk_bytes // games))
+    e_step = max(1, chunk_bytes // (games * s_step))
+    for s0 in range(0, len(outcomes), s_step):
+        s1 = min(len(outcomes), s0 + s_step)
+        for e0 in range(0, len(entries), e_step):
+            yield e0, min(len(entries), e0 + e_step), s0, s1
+
+
+def _score_block(entries: np.ndarray, outcomes: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    return _weighted_hits(entries[:, None, :], outcomes[None, :, :], weights)
+
+
+def _score_fields(fields: np.ndarray, outcomes: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    return _weighted_hits(fields, outcomes[:, None, :], weights)
+
+
+def _weighted_hits(entries: np.ndarray, outcomes: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    hits = entries == outcomes
+    # viewing the booleans as int8 keeps the product in integer arithmetic
+    return hits.view(np.int8) @ weights
@@ -0,0 +1,17 @@
+from benchmarks.bench import compare, run_benchmarks
+
+
+def test_run_benchmarks_smoke():
+    results = run_benchmarks(sizes=[2, 8], csv_rows=[50], repeat=1, gui=False)
+    assert set(results) == {
+        "dp/n=2", "marginals_dp/n=2", "solve/n=2", "structure_matches/n=2",
+        "dp/n=8", "marginals_dp/n=8", "solve/n=8", "structure_matches/n=8",
+        "load_from_csv/rows=50",
+    }
+    assert all(seconds >= 0 for seconds in results.values())
+
+
+def test_compare_flags_regressions():
+    baseline = {"a": 1.0, "b": 1.0, "c": 1.0}
+    current = {"a": 1.2, "b": 1.3, "d": 9.0}
+    assert compare(current, baseline, tolerance=0.25) == [("b", 1.0, 1.3)]
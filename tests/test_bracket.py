@@ -1,6 +1,15 @@
+import collections
+import itertools
+import math
+import os
+import pickle
+
+import numpy as np
 import pytest
 
-from bracket import BracketSimulator
+import bracket
+from benchmarks.bench import random_matrix
+from bracket import BracketSimulator, RatingFallback, SparseProbabilities, profiling, read_teams
 
 
 def make_simple_teams(n):
@@ -72,7 +81,7 @@ def test_structure_matches():
              ("A", "D"): 0.5, ("D", "A"): 0.5}
     sim = BracketSimulator(teams, probs)
     champ, _, struct = sim.most_likely_bracket()
-    matches = BracketSimulator.structure_matches(struct, len(teams))
+    matches = BracketSimulator.structure_matches(struct, teams)
     # first-round matches are A vs B and C vs D
     first_round = [m for m in matches if m[0] == 1]
     assert set((m[1], m[2]) for m in first_round) == {("A", "B"), ("C", "D")}
@@ -115,6 +124,22 @@ def test_bracket_widget_and_images(tmp_path):
     assert "A" in w.images
 
 
+def test_gui_reuses_simulator_until_csv_changes(tmp_path):
+    from main import MainWindow
+    from PyQt5 import QtWidgets
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    w = MainWindow()
+    w.teams = ["A", "B", "C", "D"]
+    csv_path = tmp_path / "probs.csv"
+    csv_path.write_text("A,B,0.6\n")
+    w.probs_file = str(csv_path)
+    first = w._simulator()
+    assert w._simulator() is first
+    csv_path.write_text("A,B,0.25\n")
+    assert w._simulator().matrix[0, 1] == pytest.approx(0.25)
+
+
 def test_structure_matches():
     # build a small 4-team bracket with predictable probabilities
     teams = ["A", "B", "C", "D"]
@@ -123,10 +148,822 @@ def test_structure_matches():
              ("A", "D"): 0.5, ("D", "A"): 0.5}
     sim = BracketSimulator(teams, probs)
     champ, _, struct = sim.most_likely_bracket()
-    matches = BracketSimulator.structure_matches(struct, len(teams))
+    matches = BracketSimulator.structure_matches(struct, teams)
     # first-round matches are A vs B and C vs D
     first_round = [m for m in matches if m[0] == 1]
     assert set((m[1], m[2]) for m in first_round) == {("A", "B"), ("C", "D")}
     # final match should involve A (winner of left) and D (winner of right)
     final = next(m for m in matches if m[0] == 2)
     assert final[1:] == ("A", "D", champ)
+
+
+def test_probability_matrix_from_pairwise():
+    teams = ["A", "B", "C", "D"]
+    # pairs with unknown teams are ignored, missing pairs default to 0.5
+    probs = {("A", "B"): 0.9, ("B", "A"): 0.1, ("A", "Z"): 0.3}
+    sim = BracketSimulator(teams, probs)
+    assert sim.matrix.shape == (4, 4)
+    assert sim.matrix[0, 1] == 0.9
+    assert sim.matrix[1, 0] == 0.1
+    assert sim.matrix[2, 3] == 0.5
+    assert sim._p("A", "B") == 0.9
+    with pytest.raises(ValueError):
+        BracketSimulator(teams, matrix=[[0.5, 0.5], [0.5, 0.5]])
+
+
+def test_load_from_csv_matrix(tmp_path):
+    path = tmp_path / "probs.csv"
+    path.write_text("# comment\nA,B,0.8\nC,D,0.25\nA,X,0.6\n")
+    sim = BracketSimulator.load_from_csv(["A", "B", "C", "D"], str(path))
+    assert sim.matrix[0, 1] == pytest.approx(0.8)
+    assert sim.matrix[1, 0] == pytest.approx(0.2)
+    assert sim.matrix[3, 2] == pytest.approx(0.75)
+    assert sim.matrix[0, 2] == 0.5
+
+
+def reference_marginals(matrix, idx):
+    # straightforward recursive convolution used as a correctness oracle
+    if len(idx) == 1:
+        return {idx[0]: 1.0}
+    half = len(idx) // 2
+    left = reference_marginals(matrix, idx[:half])
+    right = reference_marginals(matrix, idx[half:])
+    dist = {}
+    for a, pa in left.items():
+        for b, pb in right.items():
+            dist[a] = dist.get(a, 0.0) + pa * pb * matrix[a, b]
+            dist[b] = dist.get(b, 0.0) + pa * pb * (1 - matrix[a, b])
+    return dist
+
+
+def test_vectorized_marginals_match_reference():
+    teams = make_simple_teams(16)
+    matrix = random_matrix(16)
+    sim = BracketSimulator(teams, matrix=matrix)
+    expected = reference_marginals(matrix, list(range(16)))
+    marginals = sim.probability_of_each_team()
+    for i, t in enumerate(teams):
+        assert marginals[t] == pytest.approx(expected[i], rel=1e-9)
+
+
+def test_round_probabilities():
+    teams = make_simple_teams(16)
+    matrix = random_matrix(16, seed=1)
+    sim = BracketSimulator(teams, matrix=matrix)
+    table = sim.round_probabilities()
+    assert table.shape == (16, 4)
+    # every round has exactly 16 / 2**(r+1) winners in expectation
+    for r in range(4):
+        assert table[:, r].sum() == pytest.approx(16 / 2 ** (r + 1))
+    # first-round odds come straight from the matrix
+    assert table[0, 0] == pytest.approx(matrix[0, 1])
+    # advancing further is never more likely than advancing less far
+    assert np.all(np.diff(table, axis=1) <= 1e-12)
+    expected = reference_marginals(matrix, list(range(16)))
+    assert table[:, -1] == pytest.approx([expected[i] for i in range(16)])
+
+
+def test_simulate_brackets():
+    teams = make_simple_teams(8)
+    matrix = random_matrix(8, seed=2)
+    sim = BracketSimulator(teams, matrix=matrix)
+    outcomes = sim.simulate(200000, seed=42)
+    assert outcomes.shape == (200000, 7)
+    assert np.array_equal(sim.simulate(100, seed=7), sim.simulate(100, seed=7))
+    # every game is won by one of the winners of the games feeding it
+    for k in range(3):
+        assert np.all((outcomes[:, k] == outcomes[:, 2 * k + 1]) | (outcomes[:, k] == outcomes[:, 2 * k + 2]))
+    # first-round games are between adjacent slots
+    assert np.all(outcomes[:, 3:] // 2 == np.arange(4))
+    champs = np.bincount(outcomes[:, 0], minlength=8) / len(outcomes)
+    assert champs == pytest.approx(sim.round_probabilities()[:, -1], abs=5e-3)
+
+
+def test_simulate_counts_independent_of_workers(monkeypatch):
+    teams = make_simple_teams(8)
+    sim = BracketSimulator(teams, matrix=random_matrix(8, seed=3))
+    serial = sim.simulate_counts(10001, seed=5, workers=1, shard_size=1000)
+    # without workers the shards run in-process, as for CSV parsing
+    with monkeypatch.context() as m:
+        m.setattr(bracket, "ProcessPoolExecutor", None)
+        assert np.array_equal(sim.simulate_counts(10001, seed=5, shard_size=1000), serial)
+    parallel = sim.simulate_counts(10001, seed=5, workers=3, shard_size=1000)
+    assert np.array_equal(serial, parallel)
+    assert serial.dtype == np.int64
+    # each round has a fixed number of winners per bracket
+    assert list(serial.sum(axis=0)) == [10001 * 4, 10001 * 2, 10001]
+    assert serial[:, -1] / 10001 == pytest.approx(sim.round_probabilities()[:, -1], abs=0.02)
+
+
+def enumerate_brackets(matrix):
+    # yield (probability, heap-ordered winners) for every possible bracket
+    n = len(matrix)
+    for bits in itertools.product([0, 1], repeat=n - 1):
+        nodes = list(range(n))  # winners of the current round, left to right
+        winners = [0] * (n - 1)
+        prob = 1.0
+        games = n // 2
+        picks = iter(bits)
+        while games:
+            nxt = []
+            for g in range(games):
+                a, b = nodes[2 * g], nodes[2 * g + 1]
+                if next(picks):
+                    nxt.append(b)
+                    prob *= 1 - matrix[a, b]
+                else:
+                    nxt.append(a)
+                    prob *= matrix[a, b]
+            winners[games - 1 : 2 * games - 1] = nxt
+            nodes = nxt
+            games //= 2
+        yield prob, winners
+
+
+def test_most_likely_bracket_matches_enumeration():
+    teams = make_simple_teams(8)
+    matrix = random_matrix(8, seed=4)
+    sim = BracketSimulator(teams, matrix=matrix)
+    champ, prob, winners = sim.most_likely_bracket()
+    best_prob, best_winners = max(enumerate_brackets(matrix), key=lambda x: x[0])
+    assert prob == pytest.approx(best_prob)
+    assert list(winners) == best_winners
+    assert champ == teams[best_winners[0]]
+    flat = BracketSimulator.flatten_structure(winners, teams)
+    assert [r for r, _ in flat] == [1, 1, 1, 1, 2, 2, 3]
+    assert flat[-1] == (3, champ)
+
+
+def test_log_space_large_field():
+    # with 2047 coin-flip games the raw bracket probability underflows
+    n = 2048
+    sim = BracketSimulator(make_simple_teams(n), matrix=np.full((n, n), 0.5))
+    assert sim.most_likely_bracket()[1] == 0.0
+    _, log_prob, winners = sim.most_likely_bracket(log_space=True)
+    assert log_prob == pytest.approx((n - 1) * np.log(0.5))
+    assert len(winners) == n - 1
+    log_marginals = sim.probability_of_each_team(log_space=True)
+    assert log_marginals["T0"] == pytest.approx(np.log(1 / n))
+
+
+def test_log_space_marginals_match_linear():
+    sim = BracketSimulator(make_simple_teams(16), matrix=random_matrix(16, seed=5))
+    assert np.exp(sim.round_probabilities(log_space=True)) == pytest.approx(sim.round_probabilities())
+
+
+def test_top_k_brackets_match_enumeration():
+    teams = make_simple_teams(8)
+    matrix = random_matrix(8, seed=6)
+    sim = BracketSimulator(teams, matrix=matrix)
+    expected = sorted(enumerate_brackets(matrix), key=lambda x: -x[0])[:20]
+    top = sim.top_k_brackets(20)
+    assert len(top) == 20
+    for (prob, winners), (exp_prob, exp_winners) in zip(top, expected):
+        assert prob == pytest.approx(exp_prob)
+        assert list(winners) == exp_winners
+    # the single best bracket agrees with most_likely_bracket
+    _, best_prob, best = sim.most_likely_bracket()
+    assert np.array_equal(top[0][1], best)
+    # asking for more brackets than exist returns all of them
+    assert len(BracketSimulator(["A", "B"], {("A", "B"): 0.7}).top_k_brackets(5)) == 2
+    with pytest.raises(ValueError):
+        sim.top_k_brackets(0)
+
+
+def test_best_expected_score_bracket_matches_enumeration():
+    teams = make_simple_teams(8)
+    matrix = random_matrix(8, seed=14)
+    sim = BracketSimulator(teams, matrix=matrix)
+    q = sim.round_probabilities()
+
+    def expected_score(winners, points):
+        # heap node k belongs to round 3 - bit_length(k + 1), counting from 0
+        rounds = [3 - (k + 1).bit_length() for k in range(len(winners))]
+        return sum(points[w, r] * q[w, r] for w, r in zip(winners, rounds))
+
+    for scoring in ([1, 2, 4], np.random.default_rng(3).random((8, 3))):
+        points = np.broadcast_to(np.asarray(scoring, dtype=float), (8, 3))
+        best = max(expected_score(w, points) for _, w in enumerate_brackets(matrix))
+        champ, score, winners = sim.best_expected_score_bracket(scoring)
+        assert score == pytest.approx(best)
+        assert expected_score(list(winners), points) == pytest.approx(best)
+        assert champ == teams[winners[0]]
+    # default weights double every round
+    assert sim.best_expected_score_bracket()[1] == pytest.approx(sim.best_expected_score_bracket([1, 2, 4])[1])
+
+
+def test_optimize_pool_bracket_matches_exact_win_probability(monkeypatch):
+    teams = make_simple_teams(4)
+    sim = BracketSimulator(teams, matrix=random_matrix(4, seed=15))
+    public = BracketSimulator(teams, matrix=random_matrix(4, seed=16))
+    brackets = list(enumerate_brackets(sim.matrix))
+    picks = list(enumerate_brackets(public.matrix))
+    weights = np.array([2.0, 1.0, 1.0])
+
+    def exact(candidate):
+        # one opponent: win outright or split a tie
+        total = 0.0
+        for p, outcome in brackets:
+            mine = weights @ (np.array(candidate) == outcome)
+            for q, opponent in picks:
+                theirs = weights @ (np.array(opponent) == outcome)
+                total += p * q * (1.0 if mine > theirs else 0.5 if mine == theirs else 0.0)
+        return total
+
+    result = sim.optimize_pool_bracket(2, public=public, candidates=[w for _, w in brackets], n=200000, seed=2)
+    expected = np.array([exact(w) for _, w in brackets])
+    assert result.win_probabilities == pytest.approx(expected, abs=0.01)
+    assert result.win_probability == result.win_probabilities.max()
+    assert exact(list(result.winners)) == pytest.approx(expected.max(), abs=0.01)
+
+    # shards make the estimate independent of the number of workers
+    serial = sim.optimize_pool_bracket(5, candidates=6, n=3000, seed=4, shard_size=1000, workers=1)
+    parallel = sim.optimize_pool_bracket(5, candidates=6, n=3000, seed=4, shard_size=1000, workers=2)
+    assert np.array_equal(serial.candidates, parallel.candidates)
+    assert np.array_equal(serial.win_probabilities, parallel.win_probabilities)
+    with monkeypatch.context() as m:
+        m.setattr(bracket, "ProcessPoolExecutor", None)
+        default = sim.optimize_pool_bracket(5, candidates=6, n=3000, seed=4, shard_size=1000)
+    assert np.array_equal(default.win_probabilities, serial.win_probabilities)
+    assert sim.optimize_pool_bracket(1, candidates=2, n=10).win_probability == 1.0
+    with pytest.raises(ValueError):
+        sim.optimize_pool_bracket(0)
+    with pytest.raises(ValueError):
+        sim.optimize_pool_bracket(5, n=0)
+
+
+def test_byes_and_play_in_games(tmp_path):
+    names = ["A", "B1", "B2", "C", "D", "E1", "E2", "F", "G", "H"]
+    full = random_matrix(len(names), seed=17)
+    pairwise = {(a, b): full[i, j] for i, a in enumerate(names) for j, b in enumerate(names) if i != j}
+    entries = ["A", ("B1", "B2"), "C", "D", ("E1", "E2"), "F", "G", "H"]
+    sim = BracketSimulator(entries, pairwise)
+    assert len(sim.teams) == 16 and sim.teams[:4] == ["A", None, "B1", "B2"]
+
+    # reference: run the main bracket once per combination of play-in winners
+    expected = dict.fromkeys(names, 0.0)
+    for b, e in itertools.product(["B1", "B2"], ["E1", "E2"]):
+        weight = pairwise[(b, "B2" if b == "B1" else "B1")] * pairwise[(e, "E2" if e == "E1" else "E1")]
+        field = ["A", b, "C", "D", e, "F", "G", "H"]
+        for team, p in BracketSimulator(field, pairwise).probability_of_each_team().items():
+            expected[team] += weight * p
+    marginals = sim.probability_of_each_team()
+    assert set(marginals) == set(names)
+    assert marginals == pytest.approx(expected)
+    assert sim.solve().marginals == pytest.approx(expected)
+
+    champ, _, winners = sim.most_likely_bracket()
+    matches = BracketSimulator.structure_matches(winners, sim.teams, sim.play_in_rounds)
+    # only the two play-ins are listed, as round 0
+    assert sim.play_in_rounds == 1
+    assert [m[1:3] for m in matches if m[0] == 0] == [("B1", "B2"), ("E1", "E2")]
+    assert [m[0] for m in matches] == [0, 0, 1, 1, 1, 1, 2, 2, 3]
+    assert len(matches) == 2 + 7
+    assert all(sim.teams[w] is not None for w in np.unique(sim.simulate(200, seed=1)))
+
+    # a bye sends its opponent straight to the next round
+    byes = BracketSimulator(["A", None, "C", "D"], pairwise)
+    p = pairwise
+    assert byes.probability_of_each_team()["A"] == pytest.approx(
+        p[("A", "C")] * p[("C", "D")] + p[("A", "D")] * p[("D", "C")]
+    )
+    assert [m[0] for m in BracketSimulator.structure_matches(byes.most_likely_bracket()[2], byes.teams)] == [1, 2]
+
+    # two byes meeting decide nothing: the bracket keeps its likelihood and
+    # no two ranked brackets differ only in which bye advanced
+    adjacent = BracketSimulator(["A", "B", None, None], {("A", "B"): 0.7})
+    assert adjacent.most_likely_bracket()[1] == pytest.approx(0.7)
+    top = adjacent.top_k_brackets(5)
+    assert [q for q, _ in top] == pytest.approx([0.7, 0.3])
+    assert adjacent.probability_of_each_team() == pytest.approx({"A": 0.7, "B": 0.3})
+    mixed = BracketSimulator(["A", ("B", "C"), None, "D"])
+    assert mixed.most_likely_bracket()[1] == pytest.approx(0.125)
+    assert mixed.solve().probability == pytest.approx(0.125)
+    assert sum(q for q, _ in mixed.top_k_brackets(20)) == pytest.approx(1.0)
+    assert len(mixed.top_k_brackets(20)) == 8
+    store = SparseProbabilities.from_pairwise(mixed.teams, {})
+    sparse = BracketSimulator(["A", ("B", "C"), None, "D"], matrix=store)
+    assert sparse.most_likely_bracket()[1] == pytest.approx(0.125)
+    # byes are decided on lookup: the store gains no pairs and a caller's
+    # matrix is not written to
+    assert store.keys.size == 0
+    matrix = random_matrix(8, seed=18)
+    before = matrix.copy()
+    dense = BracketSimulator(mixed.teams, matrix=matrix)
+    # of the byes only the one meeting another bye wins a game
+    assert dense.round_probabilities()[[1, 4, 5, 7]].tolist() == [[0, 0, 0], [1, 0, 0], [0, 0, 0], [0, 0, 0]]
+    assert np.array_equal(matrix, before)
+    stack_path = tmp_path / "stack.npy"
+    np.save(stack_path, np.stack([matrix, 1 - matrix.T]))
+    stack = np.load(stack_path, mmap_mode="r")
+    scenarios = dense.scenario_round_probabilities(stack)
+    assert scenarios[0] == pytest.approx(dense.round_probabilities())
+
+    # loaders and the binary cache understand the same entries
+    path = tmp_path / "probs.csv"
+    path.write_text("".join(f"{a},{b},{q}\n" for (a, b), q in pairwise.items()))
+    loaded = BracketSimulator.load_from_csv(entries, str(path))
+    assert loaded.probability_of_each_team() == pytest.approx(expected)
+    cached = BracketSimulator.load_cached(entries, str(path), mmap=True)
+    cached = BracketSimulator.load_cached(entries, str(path), mmap=True)
+    assert isinstance(cached.matrix, np.memmap)
+    assert cached.probability_of_each_team() == pytest.approx(expected)
+    with pytest.raises(ValueError):
+        BracketSimulator(["A", ("B1",), "C", "D"], pairwise)
+
+
+def test_first_four_rounds_and_scoring():
+    # a 68-team field: 60 seeded teams and four First Four games
+    entries = [f"T{i}" for i in range(64)]
+    for e in (15, 31, 47, 63):
+        entries[e] = (f"T{e}a", f"T{e}b")
+    names = [n for e in entries for n in (e if isinstance(e, tuple) else (e,))]
+    full = random_matrix(len(names), seed=19)
+    pairwise = {(a, b): full[i, j] for i, a in enumerate(names) for j, b in enumerate(names) if i != j}
+    sim = BracketSimulator(entries, pairwise)
+    assert len(names) == 68 and sim.play_in_rounds == 1
+    rounds = sim.round_probabilities()
+    assert rounds.shape == (128, 7)
+
+    # six weights for the six real rounds; play-ins and walkovers score nothing
+    scoring = [1, 2, 4, 8, 16, 32]
+    champ, score, winners = sim.best_expected_score_bracket(scoring)
+    expected = 0.0
+    for r, points in enumerate(scoring, start=1):
+        start, stop = sim.topology.round_columns(r)
+        expected += points * rounds[winners[start:stop], r].sum()
+    assert score == pytest.approx(expected)
+    assert sim.best_expected_score_bracket()[1] == pytest.approx(score)
+    with pytest.raises(ValueError):
+        sim.best_expected_score_bracket([0] + scoring)
+
+    matches = BracketSimulator.structure_matches(winners, sim.teams, sim.play_in_rounds)
+    counts = collections.Counter(m[0] for m in matches)
+    assert counts == {0: 4, 1: 32, 2: 16, 3: 8, 4: 4, 5: 2, 6: 1}
+    assert [m[1:3] for m in matches if m[0] == 0][0] == ("T15a", "T15b")
+
+    # round 1 of lock_result is the first real round, the First Four round 0
+    sim.lock_result(1, 0, "T1")
+    sim.lock_result(0, 15, "T15b")
+    assert sim.locked_results() == {(0, 15): "T15b", (1, 0): "T1"}
+    rounds = sim.round_probabilities()
+    assert rounds[sim.index["T1"], 1] == pytest.approx(1.0)
+    assert rounds[sim.index["T0"], 1] == 0.0
+    assert rounds[sim.index["T15a"], 0] == 0.0
+    with pytest.raises(ValueError):
+        sim.lock_result(1, 1, "T1")
+    sim.clear_results()
+
+    result = sim.optimize_pool_bracket(3, candidates=4, n=200, scoring=scoring, seed=5)
+    assert result.winners.shape == (127,)
+    default = sim.optimize_pool_bracket(3, candidates=4, n=200, seed=5)
+    assert np.array_equal(default.winners, result.winners)
+    assert default.win_probabilities == pytest.approx(result.win_probabilities)
+    with pytest.raises(ValueError):
+        sim.optimize_pool_bracket(3, candidates=4, n=200, scoring=[0] + scoring)
+
+
+def test_read_teams(tmp_path):
+    path = tmp_path / "teams.txt"
+    path.write_text("# region 1\nA\nB1 / B2\n\nbye\nD\n")
+    entries = read_teams(str(path))
+    assert entries == ["A", ("B1", "B2"), None, "D"]
+    assert BracketSimulator(entries).teams == ["A", None, "B1", "B2", None, None, "D", None]
+
+    # the GUI loads the same syntax and matches images against every team
+    from main import MainWindow
+    from PyQt5 import QtWidgets, QtGui, QtCore
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    w = MainWindow()
+    w.teams = entries
+    pix = QtGui.QPixmap(10, 10)
+    pix.fill(QtCore.Qt.red)
+    pix.save(str(tmp_path / "B2.png"))
+    w._load_images_from_dir(str(tmp_path))
+    assert list(w.images) == ["B2"]
+    probs = tmp_path / "probs.csv"
+    probs.write_text("B1,B2,0.9\n")
+    w.probs_file = str(probs)
+    assert w._simulator().probability_of_each_team()["B2"] < w._simulator().probability_of_each_team()["B1"]
+
+
+def test_binary_roundtrip(tmp_path):
+    teams = make_simple_teams(8)
+    sim = BracketSimulator(teams, matrix=random_matrix(8, seed=7))
+    path = str(tmp_path / "probs.npy")
+    sim.save_binary(path)
+    loaded = BracketSimulator.load_binary(path)
+    assert loaded.teams == teams
+    assert np.array_equal(loaded.matrix, sim.matrix)
+
+
+def test_load_cached_invalidation(tmp_path, monkeypatch):
+    teams = ["A", "B", "C", "D"]
+    csv_path = tmp_path / "probs.csv"
+    csv_path.write_text("A,B,0.8\nC,D,0.25\n")
+    first = BracketSimulator.load_cached(teams, str(csv_path))
+    assert (tmp_path / "probs.csv.cache.npy").exists()
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("CSV should not be parsed")
+
+    # unchanged (or merely touched) file is served from the cache
+    monkeypatch.setattr(BracketSimulator, "load_from_csv", classmethod(no_parse))
+    assert np.array_equal(BracketSimulator.load_cached(teams, str(csv_path)).matrix, first.matrix)
+    stat = csv_path.stat()
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    hashed = []
+    signature = bracket._file_signature
+
+    def counting_signature(path, with_hash=True):
+        hashed.append(with_hash)
+        return signature(path, with_hash)
+
+    monkeypatch.setattr(bracket, "_file_signature", counting_signature)
+    assert np.array_equal(BracketSimulator.load_cached(teams, str(csv_path)).matrix, first.matrix)
+    # the touched file is hashed once and the refreshed key reused
+    assert hashed.count(True) == 1
+    monkeypatch.undo()
+
+    # a missing or truncated matrix next to a valid sidecar is rebuilt
+    matrix_path = tmp_path / "probs.csv.cache.npy"
+    matrix_path.unlink()
+    assert np.array_equal(BracketSimulator.load_cached(teams, str(csv_path)).matrix, first.matrix)
+    matrix_path.write_bytes(matrix_path.read_bytes()[:40])
+    assert np.array_equal(BracketSimulator.load_cached(teams, str(csv_path)).matrix, first.matrix)
+    assert np.array_equal(BracketSimulator.load_cached(teams, str(csv_path)).matrix, first.matrix)
+
+    # new contents or a different team list force a re-parse
+    csv_path.write_text("A,B,0.6\nC,D,0.25\n")
+    assert BracketSimulator.load_cached(teams, str(csv_path)).matrix[0, 1] == pytest.approx(0.6)
+    assert BracketSimulator.load_cached(["B", "A", "C", "D"], str(csv_path)).matrix[0, 1] == pytest.approx(0.4)
+
+
+def test_load_binary_memmap(tmp_path):
+    teams = make_simple_teams(16)
+    sim = BracketSimulator(teams, matrix=random_matrix(16, seed=8))
+    path = str(tmp_path / "probs.npy")
+    sim.save_binary(path)
+    mapped = BracketSimulator.load_binary(path, mmap=True)
+    assert isinstance(mapped.matrix, np.memmap)
+    assert not mapped.matrix.flags.writeable
+    assert mapped.round_probabilities() == pytest.approx(sim.round_probabilities())
+    # pickling (as done for pool workers) re-opens the file instead of copying
+    payload = pickle.dumps(mapped)
+    assert len(payload) < mapped.matrix.nbytes
+    clone = pickle.loads(payload)
+    assert isinstance(clone.matrix, np.memmap)
+    assert np.array_equal(clone.matrix, sim.matrix)
+    counts = mapped.simulate_counts(2000, seed=1, workers=2, shard_size=500)
+    assert np.array_equal(counts, sim.simulate_counts(2000, seed=1, workers=1, shard_size=500))
+
+
+def test_streaming_csv_loader(tmp_path):
+    teams = ["A", "B", "C", "D"]
+    path = tmp_path / "probs.csv"
+    path.write_text(
+        "A,B,0.8\n"
+        "broken row\n"
+        "C,D,not-a-number\n"
+        "A,C,1.5\n"
+        "A,Z,0.3\n"
+        "C,D,0.25\n"
+        "B,A,0.4\n"  # later rows override earlier ones in both directions
+        "B,D,0.9\n"
+    )
+    reports = []
+    sim = BracketSimulator.load_from_csv(teams, str(path), chunk_bytes=16, on_chunk=reports.append)
+    assert sim.matrix[0, 1] == pytest.approx(0.6)
+    assert sim.matrix[1, 0] == pytest.approx(0.4)
+    assert sim.matrix[2, 3] == pytest.approx(0.25)
+    assert sim.matrix[0, 2] == 0.5
+    assert len(reports) > 1
+    assert [r.chunk for r in reports] == list(range(len(reports)))
+    assert sum(r.rows for r in reports) == 4
+    assert sum(r.rejected for r in reports) == 3
+    assert sum(r.skipped for r in reports) == 1
+    assert sum(r.nbytes for r in reports) == path.stat().st_size
+
+    parallel = BracketSimulator.load_from_csv(teams, str(path), workers=2, chunk_bytes=16)
+    assert np.array_equal(parallel.matrix, sim.matrix)
+
+
+def test_sparse_probabilities_with_rating_fallback(tmp_path):
+    teams = make_simple_teams(8)
+    ratings = np.linspace(10, -10, 8)
+    fallback = RatingFallback(ratings, scale=5.0)
+    store = SparseProbabilities.from_pairwise(teams, {("T0", "T1"): 0.9, ("T1", "T0"): 0.1}, fallback)
+    assert store.nbytes == 2 * (8 + 8)
+    assert store[0, 1] == 0.9
+    assert store[2, 3] == pytest.approx(1 / (1 + np.exp(-(ratings[2] - ratings[3]) / 5.0)))
+    block = store[np.arange(8)[:, None], np.arange(8)[None, :]]
+    assert block.shape == (8, 8)
+    assert np.array_equal(block, store.to_dense())
+
+    sparse = BracketSimulator(teams, matrix=store)
+    dense = BracketSimulator(teams, matrix=store.to_dense())
+    assert sparse.round_probabilities() == pytest.approx(dense.round_probabilities())
+    assert np.array_equal(sparse.most_likely_bracket()[2], dense.most_likely_bracket()[2])
+    assert np.array_equal(sparse.simulate(100, seed=1), dense.simulate(100, seed=1))
+
+    path = tmp_path / "probs.csv"
+    path.write_text("T0,T1,0.9\nT2,T3,0.3\nT2,T3,0.35\n")
+    loaded = BracketSimulator.load_from_csv(teams, str(path), sparse=True, fallback=fallback)
+    assert isinstance(loaded.matrix, SparseProbabilities)
+    assert loaded.matrix[3, 2] == pytest.approx(0.65)
+    assert loaded.matrix[4, 5] == pytest.approx(fallback(np.array(4), np.array(5)))
+
+
+def test_from_ratings(tmp_path):
+    teams = ["A", "B", "C", "D"]
+    sim = BracketSimulator.from_ratings(teams, {"A": 1600, "B": 1400, "C": 1500, "D": 1500}, link="elo")
+    assert sim.matrix[0, 1] == pytest.approx(1 / (1 + 10 ** (-200 / 400)))
+    assert sim.matrix[2, 3] == pytest.approx(0.5)
+    assert sim.matrix + sim.matrix.T == pytest.approx(np.ones((4, 4)))
+
+    margins = [12.0, -3.0, 4.5, 0.0]
+    normal = BracketSimulator.from_ratings(teams, margins, link="normal", scale=11.0)
+    assert normal.matrix[0, 1] == pytest.approx(0.5 * (1 + math.erf(15.0 / 11.0 / math.sqrt(2))), abs=1e-6)
+    assert normal.matrix + normal.matrix.T == pytest.approx(np.ones((4, 4)))
+
+    with pytest.raises(ValueError):
+        BracketSimulator.from_ratings(teams, {"A": 1.0})
+
+    # a ratings sequence follows the expanded slots, byes included
+    entries = ["A", ("B", "C")]
+    by_slot = BracketSimulator.from_ratings(entries, [12.0, 0.0, -3.0, 4.5], link="normal", scale=11.0)
+    assert by_slot.teams == ["A", None, "B", "C"]
+    by_name = BracketSimulator.from_ratings(entries, {"A": 12.0, "B": -3.0, "C": 4.5}, link="normal", scale=11.0)
+    assert by_slot.probability_of_each_team() == pytest.approx(by_name.probability_of_each_team())
+    with pytest.raises(ValueError):
+        BracketSimulator.from_ratings(entries, [12.0, -3.0, 4.5])
+
+    path = tmp_path / "ratings.csv"
+    path.write_text("A,12\nB,-3\nC,4.5\nD,0\n")
+    loaded = BracketSimulator.load_from_ratings_csv(teams, str(path), link="normal", scale=11.0)
+    assert np.array_equal(loaded.matrix, normal.matrix)
+
+    # a header and malformed rows are counted and skipped
+    path.write_text("team,rating\nA,12\nB,-3,extra\nB,-3\nC,nan\nC,4.5\nD,0\n")
+    reports = []
+    loaded = BracketSimulator.load_from_ratings_csv(
+        teams, str(path), link="normal", scale=11.0, on_chunk=reports.append
+    )
+    assert np.array_equal(loaded.matrix, normal.matrix)
+    assert [(r.rows, r.rejected) for r in reports] == [(4, 3)]
+
+
+def test_solve_matches_separate_queries():
+    teams = make_simple_teams(16)
+    matrix = random_matrix(16, seed=13)
+    result = BracketSimulator(teams, matrix=matrix).solve()
+    ref = BracketSimulator(teams, matrix=matrix)
+    champ, prob, winners = ref.most_likely_bracket()
+    assert result.champion == champ
+    assert result.probability == pytest.approx(prob)
+    assert np.array_equal(result.winners, winners)
+    assert result.marginals == pytest.approx(ref.probability_of_each_team())
+    assert result.rounds == pytest.approx(ref.round_probabilities())
+
+    # conditioned on a lock, in log space
+    sim = BracketSimulator(teams, matrix=matrix)
+    sim.lock_result(2, 1, "T6")
+    ref.lock_result(2, 1, "T6")
+    result = sim.solve(log_space=True)
+    assert result.probability == pytest.approx(ref.most_likely_bracket(log_space=True)[1])
+    assert np.array_equal(result.winners, ref.most_likely_bracket()[2])
+    assert result.rounds == pytest.approx(ref.round_probabilities(log_space=True))
+    # the max pass reused the log-sum normalizers instead of a third pass
+    assert set(sim._tables) == {"logsum", "max"}
+
+
+def test_scenario_round_probabilities():
+    teams = make_simple_teams(16)
+    stack = np.stack([random_matrix(16, seed=s) for s in range(5)])
+    sim = BracketSimulator(teams, matrix=stack[0])
+    batch = sim.scenario_round_probabilities(stack)
+    assert batch.shape == (5, 16, 4)
+    for s in range(5):
+        expected = BracketSimulator(teams, matrix=stack[s]).round_probabilities()
+        assert batch[s] == pytest.approx(expected)
+
+    sim.lock_result(1, 3, "T7")
+    logs = sim.scenario_round_probabilities(list(stack), log_space=True)
+    for s in range(5):
+        ref = BracketSimulator(teams, matrix=stack[s])
+        ref.lock_result(1, 3, "T7")
+        assert np.exp(logs[s]) == pytest.approx(ref.round_probabilities())
+
+    with pytest.raises(ValueError):
+        sim.scenario_round_probabilities(stack[:, :8, :8])
+
+
+def test_set_probability_recomputes_only_affected_path():
+    teams = make_simple_teams(16)
+    matrix = random_matrix(16, seed=9)
+    sim = BracketSimulator(teams, matrix=matrix.copy())
+    sim.round_probabilities()
+    sim.most_likely_bracket()
+
+    sim.set_probability("T2", "T5", 0.99)
+    # T2 and T5 could first meet in round 3; only that game and the final are stale
+    for tables in sim._tables.values():
+        assert [int(s.sum()) for s in tables.stale] == [0, 0, 1, 1]
+        assert tables.stale[2][0]
+
+    matrix[2, 5], matrix[5, 2] = 0.99, 0.01
+    fresh = BracketSimulator(teams, matrix=matrix)
+    assert sim.round_probabilities() == pytest.approx(fresh.round_probabilities())
+    assert np.array_equal(sim.most_likely_bracket()[2], fresh.most_likely_bracket()[2])
+    assert sim.round_probabilities(log_space=True) == pytest.approx(fresh.round_probabilities(log_space=True))
+
+
+def test_block_cache_shared_between_passes():
+    teams = make_simple_teams(16)
+    matrix = random_matrix(16, seed=12)
+    sim = BracketSimulator(teams, matrix=matrix.copy())
+    sim.round_probabilities()
+    misses = sim.block_cache.misses
+    sim.most_likely_bracket()
+    sim.round_probabilities(log_space=True)
+    # the max and log-sum passes reuse the blocks gathered by the sum pass
+    assert sim.block_cache.misses == misses
+
+    # cached blocks are patched in place rather than re-gathered
+    sim.set_probability("T3", "T12", 0.2)
+    matrix[3, 12], matrix[12, 3] = 0.2, 0.8
+    fresh = BracketSimulator(teams, matrix=matrix.copy())
+    assert sim.round_probabilities() == pytest.approx(fresh.round_probabilities())
+    assert np.array_equal(sim.most_likely_bracket()[2], fresh.most_likely_bracket()[2])
+    assert sim.block_cache.misses == misses
+
+    # direct edits need an explicit invalidate()
+    sim.matrix[0, 1], sim.matrix[1, 0] = 0.5, 0.5
+    sim.invalidate()
+    matrix[0, 1], matrix[1, 0] = 0.5, 0.5
+    fresh = BracketSimulator(teams, matrix=matrix)
+    assert sim.round_probabilities() == pytest.approx(fresh.round_probabilities())
+
+    # a tiny budget evicts blocks without changing results
+    sim.block_cache.max_bytes = 16 * 16 * 8
+    sim.invalidate()
+    assert sim.round_probabilities() == pytest.approx(fresh.round_probabilities())
+    assert [w.tolist() for _, w in sim.top_k_brackets(2)] == [w.tolist() for _, w in fresh.top_k_brackets(2)]
+    assert sim.block_cache.nbytes <= sim.block_cache.max_bytes
+
+
+def test_set_probability_on_readonly_and_sparse(tmp_path):
+    teams = make_simple_teams(4)
+    sim = BracketSimulator(teams, matrix=random_matrix(4, seed=10))
+    path = str(tmp_path / "probs.npy")
+    sim.save_binary(path)
+    mapped = BracketSimulator.load_binary(path, mmap=True)
+    mapped.set_probability("T0", "T3", 0.2)
+    assert mapped.matrix[3, 0] == pytest.approx(0.8)
+    assert BracketSimulator.load_binary(path).matrix[3, 0] == sim.matrix[3, 0]
+
+    store = SparseProbabilities.from_pairwise(teams, {})
+    sparse = BracketSimulator(teams, matrix=store)
+    sparse.set_probability("T1", "T2", 0.7)
+    assert sparse.matrix[2, 1] == pytest.approx(0.3)
+    assert sparse.matrix[0, 3] == 0.5
+    assert store[2, 1] == 0.5
+
+    # a caller's writable matrix is copied, not updated in place
+    matrix = random_matrix(4, seed=11)
+    before = matrix.copy()
+    sim = BracketSimulator(teams, matrix=matrix)
+    sim.set_probability("T0", "T1", 0.9)
+    sim.set_probability("T0", "T2", 0.9)
+    assert np.array_equal(matrix, before)
+    assert sim.matrix[1, 0] == pytest.approx(0.1)
+    with pytest.raises(ValueError):
+        sim.set_probability("T0", "Z", 0.5)
+    with pytest.raises(ValueError):
+        sim.set_probability("T0", "T1", 1.5)
+
+
+def conditioned_brackets(matrix, locks):
+    # enumerate brackets consistent with {heap position: winner}, renormalized
+    brackets = [(p, w) for p, w in enumerate_brackets(matrix) if all(w[k] == t for k, t in locks.items())]
+    total = sum(p for p, _ in brackets)
+    return [(p / total, w) for p, w in brackets]
+
+
+def conditioned_rounds(matrix, locks):
+    # (teams, rounds) probabilities of winning each round given the locks
+    n = len(matrix)
+    rounds = n.bit_length() - 1
+    table = np.zeros((n, rounds))
+    for p, w in conditioned_brackets(matrix, locks):
+        for k, t in enumerate(w):
+            table[t, rounds - (k + 1).bit_length()] += p
+    return table
+
+
+def test_locks_condition_earlier_rounds():
+    # T0 winning round 2 makes it likely that it beat T2 rather than T3
+    matrix = np.full((4, 4), 0.5)
+    matrix[0, 2], matrix[2, 0], matrix[0, 3], matrix[3, 0] = 0.99, 0.01, 0.01, 0.99
+    sim = BracketSimulator(make_simple_teams(4), matrix=matrix)
+    sim.lock_result(2, 0, "T0")
+    assert sim.round_probabilities()[2, 0] == pytest.approx(0.99)
+    assert sim.simulate_counts(20000, seed=1)[2, 0] / 20000 == pytest.approx(0.99, abs=0.005)
+
+    teams = make_simple_teams(16)
+    matrix = random_matrix(16, seed=12)
+    # {(round, game): winner} and the same locks by heap position
+    cases = [
+        ({(4, 0): "T5"}, {0: 5}),
+        ({(2, 1): "T6", (3, 1): "T12"}, {4: 6, 2: 12}),
+        ({(1, 0): "T0", (3, 0): "T2", (2, 3): "T13", (4, 0): "T13"}, {7: 0, 1: 2, 6: 13, 0: 13}),
+    ]
+    for locks, heap_locks in cases:
+        sim = BracketSimulator(teams, matrix=matrix)
+        sim.round_probabilities()
+        for (round_num, game), winner in locks.items():
+            sim.lock_result(round_num, game, winner)
+        expected = conditioned_rounds(matrix, heap_locks)
+        assert sim.round_probabilities() == pytest.approx(expected)
+        assert np.exp(sim.round_probabilities(log_space=True)) == pytest.approx(expected)
+        assert sim.solve().rounds == pytest.approx(expected)
+        assert sim.scenario_round_probabilities(matrix[None])[0] == pytest.approx(expected)
+        scenario_logs = sim.scenario_round_probabilities(matrix[None], log_space=True)[0]
+        assert np.exp(scenario_logs) == pytest.approx(expected)
+        # the sampler draws from the same conditioned distribution
+        outcomes = sim.simulate(20000, seed=3)
+        for (round_num, game), winner in locks.items():
+            start = (16 >> round_num) - 1
+            assert np.all(outcomes[:, start + game] == teams.index(winner))
+        counts = sim.simulate_counts(20000, seed=4)
+        assert counts / 20000 == pytest.approx(expected, abs=0.02)
+        # the expected score of a bracket uses the conditioned rounds
+        weights = 2.0 ** np.arange(4)
+        _, score, winners = sim.best_expected_score_bracket()
+        rounds = [4 - (k + 1).bit_length() for k in range(15)]
+        assert score == pytest.approx(sum(weights[r] * expected[w, r] for w, r in zip(winners, rounds)))
+
+
+def test_lock_results_condition_every_query():
+    teams = make_simple_teams(8)
+    matrix = random_matrix(8, seed=11)
+    sim = BracketSimulator(teams, matrix=matrix)
+    sim.round_probabilities()
+    # T1 won game 0 of round 1 (heap position 3); T2 won game 1 of round 2
+    # (heap position 1), which implies T2 also won its first-round game
+    sim.lock_result(1, 0, "T1")
+    sim.lock_result(2, 0, "T2")
+    assert sim.locked_results() == {(1, 0): "T1", (2, 0): "T2"}
+    expected = conditioned_brackets(matrix, {3: 1, 1: 2})
+
+    table = conditioned_rounds(matrix, {3: 1, 1: 2})
+    assert sim.round_probabilities() == pytest.approx(table)
+    assert np.exp(sim.round_probabilities(log_space=True)) == pytest.approx(table)
+
+    best_p, best_w = max(expected, key=lambda x: x[0])
+    champ, prob, winners = sim.most_likely_bracket()
+    assert prob == pytest.approx(best_p)
+    assert list(winners) == best_w
+    top = sim.top_k_brackets(3)
+    ranked = sorted(expected, key=lambda x: -x[0])[:3]
+    assert [p for p, _ in top] == pytest.approx([p for p, _ in ranked])
+
+    outcomes = sim.simulate(1000, seed=0)
+    assert np.all(outcomes[:, 3] == 1) and np.all(outcomes[:, 4] == 2) and np.all(outcomes[:, 1] == 2)
+
+    with pytest.raises(ValueError):
+        sim.lock_result(1, 0, "T4")  # T4 is not in that game
+    with pytest.raises(ValueError):
+        sim.lock_result(1, 1, "T3")  # contradicts T2 reaching round 2
+    with pytest.raises(ValueError):
+        sim.lock_result(1, 0, "T9")  # not in the bracket
+    with pytest.raises(ValueError):
+        sim.unlock_result(3, 0)  # nothing locked there
+    sim.clear_results()
+    fresh = BracketSimulator(teams, matrix=matrix)
+    assert sim.round_probabilities() == pytest.approx(fresh.round_probabilities())
+
+
+def test_profiling_records_phases_and_counters(tmp_path):
+    teams = make_simple_teams(8)
+    path = tmp_path / "probs.csv"
+    path.write_text("".join(f"T{i},T{j},0.6\n" for i in range(8) for j in range(i + 1, 8)) + "T0,T1,bad\n")
+    with profiling() as prof:
+        sim = BracketSimulator.load_from_csv(teams, str(path))
+        result = sim.solve()
+        BracketSimulator.structure_matches(result.winners, teams)
+        sim._p("T0", "T1")
+        sim.solve()  # served from the caches
+    assert prof.phases["csv.load"][0] == 1
+    assert prof.phases["dp.sum+max"][0] == 2
+    assert prof.phases["structure_matches"][0] == 1
+    assert prof.counters == {"csv.rows": 28, "csv.rejected": 1, "_p": 1, "matrix_lookups": 4 * 1 + 2 * 4 + 16}
+    assert prof.peak_bytes > 0
+    assert "dp.gather" in prof.report()
+
+    # nothing is recorded outside the block
+    sim.invalidate()
+    sim.solve()
+    assert prof.phases["dp.sum+max"][0] == 2
+
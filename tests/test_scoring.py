@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from benchmarks.bench import random_matrix
+from bracket import BracketSimulator
+from scoring import game_weights, score_entries, score_fields, score_histograms
+
+
+def make_sim(n, seed):
+    return BracketSimulator([f"T{i}" for i in range(n)], matrix=random_matrix(n, seed))
+
+
+def reference_score(entry, outcome, weights):
+    return sum(w for e, o, w in zip(entry, outcome, weights) if e == o)
+
+
+def test_game_weights():
+    assert game_weights(None, 7).tolist() == [4, 2, 2, 1, 1, 1, 1]
+    assert game_weights([1, 3, 10], 7).tolist() == [10, 3, 3, 1, 1, 1, 1]
+    assert game_weights([0.5, 1, 1.5], 7).dtype == np.float64
+    with pytest.raises(ValueError):
+        game_weights([1, 2], 7)
+    with pytest.raises(ValueError):
+        game_weights(None, 6)
+
+
+def test_score_entries_matches_reference():
+    sim = make_sim(16, seed=1)
+    entries = sim.simulate(37, seed=2)
+    outcomes = sim.simulate(53, seed=3)
+    weights = game_weights([1, 2, 4, 8], 15)
+    # a tiny chunk budget forces blocking along both axes
+    scores = score_entries(entries, outcomes, chunk_bytes=15 * 8)
+    assert scores.shape == (37, 53)
+    assert scores.dtype.kind == "i"
+    for e in range(0, 37, 5):
+        for s in range(0, 53, 7):
+            assert scores[e, s] == reference_score(entries[e], outcomes[s], weights)
+    assert np.array_equal(scores, score_entries(entries, outcomes))
+    # a bracket scores the maximum against itself
+    assert score_entries(outcomes[:1], outcomes[:1])[0, 0] == 4 * 8
+
+
+def test_score_histograms():
+    sim = make_sim(8, seed=4)
+    entries = sim.simulate(20, seed=5)
+    outcomes = sim.simulate(300, seed=6)
+    counts = score_histograms(entries, outcomes, [1, 2, 4], chunk_bytes=7 * 64)
+    assert counts.shape == (20, 1 + 4 + 4 + 4)
+    assert np.all(counts.sum(axis=1) == 300)
+    scores = score_entries(entries, outcomes, [1, 2, 4])
+    for e in range(20):
+        assert np.array_equal(counts[e], np.bincount(scores[e], minlength=13))
+    with pytest.raises(ValueError):
+        score_histograms(entries, outcomes, [0.5, 1, 2])
+
+
+def test_score_fields_match_score_entries():
+    sim = make_sim(8, seed=7)
+    outcomes = sim.simulate(30, seed=8)
+    fields = sim.simulate(30 * 4, seed=9).reshape(30, 4, 7)
+    for round_weights in ([1, 2, 4], [0.1, 0.2, 0.7]):
+        scores = score_fields(fields, outcomes, round_weights)
+        assert scores.shape == (30, 4)
+        for s in range(30):
+            assert scores[s] == pytest.approx(score_entries(fields[s], outcomes[s : s + 1], round_weights)[:, 0])
+    with pytest.raises(ValueError):
+        score_fields(fields[:10], outcomes)
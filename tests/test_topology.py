@@ -0,0 +1,37 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from topology import BracketTopology
+
+
+def test_topology_arrays():
+    topo = BracketTopology.of(8)
+    assert topo is BracketTopology.of(8)
+    assert (topo.n_games, topo.rounds) == (7, 3)
+    assert topo.round.tolist() == [2, 1, 1, 0, 0, 0, 0]
+    assert topo.game.tolist() == [0, 0, 1, 0, 1, 2, 3]
+    assert topo.lo.tolist() == [0, 0, 4, 0, 2, 4, 6]
+    assert topo.mid.tolist() == [4, 2, 6, 1, 3, 5, 7]
+    assert topo.hi.tolist() == [8, 4, 8, 2, 4, 6, 8]
+    assert topo.parent.tolist() == [-1, 0, 0, 1, 1, 2, 2]
+    assert topo.order.tolist() == [3, 4, 5, 6, 1, 2, 0]
+    # children cover exactly the two halves of their parent
+    for k in range(topo.n_games):
+        for child, (lo, hi) in ((topo.left[k], (topo.lo[k], topo.mid[k])), (topo.right[k], (topo.mid[k], topo.hi[k]))):
+            if child < topo.n_games:
+                assert (topo.lo[child], topo.hi[child]) == (lo, hi)
+                assert topo.parent[child] == k
+            else:
+                assert child - topo.n_games == lo and hi == lo + 1
+    assert topo.round_columns(0) == (3, 7)
+    rows, cols = topo.round_block(1)
+    matrix = np.arange(64).reshape(8, 8)
+    assert matrix[rows, cols].tolist() == [[[2, 3], [10, 11]], [[38, 39], [46, 47]]]
+    assert topo.game_of(5, 1) == 1 and topo.meeting_round(2, 5) == 2
+    assert pickle.loads(pickle.dumps(topo)) is topo
+    with pytest.raises(ValueError):
+        BracketTopology(6)
+    with pytest.raises(ValueError):
+        topo.lo[0] = 1
@@ -0,0 +1,84 @@
+"""Precomputed shape of a single-elimination bracket.
+
+Games are numbered in heap order, the same layout as the winners arrays
+used throughout :mod:`bracket`: game 0 is the championship, game ``k`` is
+fed by games ``2k + 1`` and ``2k + 2``, and heap nodes from ``n - 1`` on
+are the leaves, node ``n - 1 + s`` holding slot ``s``.  Rounds count from 0
+for the first round.  Within round ``r`` the games are numbered left to
+right and game ``g`` covers slots ``[g * 2**(r+1), (g + 1) * 2**(r+1))``.
+"""
+import functools
+from typing import List, Tuple
+
+import numpy as np
+
+
+class BracketTopology:
+    """Integer arrays describing every game of a bracket over ``n`` slots.
+
+    Per game (indexed by heap number): ``round``, ``game`` (number within
+    its round), the slot range ``lo``/``mid``/``hi`` (left side
+    ``[lo, mid)``, right side ``[mid, hi)``), ``parent`` (-1 for the final)
+    and the heap numbers of its ``left`` and ``right`` children.  Use
+    :meth:`of` to get the instance shared by everything working on brackets
+    of the same size.
+    """
+
+    def __init__(self, n: int):
+        if n < 2 or (n & (n - 1)) != 0:
+            raise ValueError("Number of slots must be a power of two and at least 2")
+        self.n = n
+        self.n_games = n - 1
+        self.rounds = n.bit_length() - 1
+        heap = np.arange(self.n_games)
+        depth = np.log2(heap + 1).astype(np.int64)
+        self.round = self.rounds - 1 - depth
+        self.game = heap - ((1 << depth) - 1)
+        width = 1 << (self.round + 1)
+        self.lo = self.game * width
+        self.mid = self.lo + width // 2
+        self.hi = self.lo + width
+        self.parent = np.where(heap > 0, (heap - 1) // 2, -1)
+        self.left = 2 * heap + 1
+        self.right = 2 * heap + 2
+        # heap columns of every round and the leaf nodes, earliest round first
+        self.order = np.concatenate([np.arange(*self.round_columns(r)) for r in range(self.rounds)])
+        self.leaves = np.arange(self.n_games, self.n_games + n)
+        self._blocks: List[Tuple[np.ndarray, np.ndarray]] = []
+        for r in range(self.rounds):
+            half = 1 << r
+            rows = np.arange(0, n, 2 * half)[:, None, None] + np.arange(half)[None, :, None]
+            self._blocks.append((rows, rows.transpose(0, 2, 1) + half))
+        for name in ("round", "game", "lo", "mid", "hi", "parent", "left", "right", "order", "leaves"):
+            getattr(self, name).flags.writeable = False
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def of(cls, n: int) -> "BracketTopology":
+        """Return the shared topology for ``n`` slots."""
+        return cls(n)
+
+    def __reduce__(self):
+        # pickled by size only, so workers share one instance per size too
+        return BracketTopology.of, (self.n,)
+
+    def round_columns(self, r: int) -> Tuple[int, int]:
+        """``(start, stop)`` of the heap columns holding round ``r``'s games."""
+        games = self.n >> (r + 1)
+        return games - 1, 2 * games - 1
+
+    def round_block(self, r: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Broadcastable ``(rows, cols)`` slot indices of round ``r``'s matchups.
+
+        Indexing a matrix with them gives a ``(games, half, half)`` block
+        with the left side of every game along the rows.
+        """
+        return self._blocks[r]
+
+    def game_of(self, slot: int, r: int) -> int:
+        """Number of the round-``r`` game that ``slot`` plays in."""
+        return slot >> (r + 1)
+
+    def meeting_round(self, i: int, j: int) -> int:
+        """Round in which slots ``i`` and ``j`` could meet."""
+        return (i ^ j).bit_length() - 1